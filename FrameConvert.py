@@ -1,92 +1,547 @@
 import cv2
+import numpy as np
 import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ResizeImg import letterbox_geometry
+from stages import _executor
+from quality import check_index_path, write_scores
 
-def process_video(video_path, output_dir):
+# Encoder parameter that quality sets for each output format
+FORMAT_PARAMS = {
+    "jpg": cv2.IMWRITE_JPEG_QUALITY,   # 0-100
+    "webp": cv2.IMWRITE_WEBP_QUALITY,  # 1-100
+    "png": cv2.IMWRITE_PNG_COMPRESSION,  # 0-9, lossless either way
+}
+
+class ExtractStats:
     """
-    coding for proces single video file
-    
-    Parameters:
-    - video_path: The path to the video file.
-    - output_dir: The directory where the extracted frames will be saved.
+    Counts the frames an extraction decoded, kept, rejected by the quality gate, suppressed as
+    near-duplicates and seeked over, for one video or segment. With a quality gate, scores holds
+    one row per scored frame. decoded counts grab() calls, frames the backend decodes internally
+    after a seek are not included. The decode, encode and write queue figures come from the
+    extraction loop and its FrameWriter.
     """
-    
-    Second=2
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.decoded = 0
+        self.kept = 0
+        self.suppressed = 0
+        self.rejected = 0
+        self.scores = []
+        self.seeks = 0
+        self.covered = 0
+        self.decode_seconds = 0.0
+        self.encoded = 0
+        self.encode_seconds = 0.0
+        self.write_seconds = 0.0
+        self.errors = 0
+        self.queue_size = 0
+        self.queue_samples = 0
+        self.queue_total = 0
+        self.queue_full = 0
+        self.start = time.perf_counter()
+
+    def report(self, name):
+        elapsed = time.perf_counter() - self.start
+        video_seconds = self.covered / self.fps if self.fps > 0 else 0.0
+        factor = video_seconds / elapsed if elapsed > 0 else 0.0
+        suppressed = f", {self.suppressed} near-duplicates suppressed" if self.suppressed else ""
+        if self.rejected:
+            suppressed += f", {self.rejected} failed the quality gate"
+        print(f"{name}: decoded {self.decoded} frames, kept {self.kept}{suppressed} ({self.seeks} seeks), "
+              f"{video_seconds:.1f}s of video in {elapsed:.1f}s ({factor:.1f}x real time)")
+        if self.queue_samples:
+            decode_fps = self.decoded / self.decode_seconds if self.decode_seconds > 0 else 0.0
+            encode_fps = self.encoded / self.encode_seconds if self.encode_seconds > 0 else 0.0
+            occupancy = self.queue_total / self.queue_samples
+            full = self.queue_full / self.queue_samples * 100
+            print(f"  decode {decode_fps:.1f} fps, encode {encode_fps:.1f} fps per writer, "
+                  f"write {self.write_seconds:.1f}s, write queue {occupancy:.1f}/{self.queue_size} on average, "
+                  f"full on {full:.0f}% of frames" + (f", {self.errors} write errors" if self.errors else ""))
+
+    def merge(self, other):
+        """Add the counts of another segment of the same video."""
+        self.decoded += other.decoded
+        self.kept += other.kept
+        self.suppressed += other.suppressed
+        self.rejected += other.rejected
+        self.scores.extend(other.scores)
+        self.seeks += other.seeks
+        self.covered += other.covered
+        self.decode_seconds += other.decode_seconds
+        self.encoded += other.encoded
+        self.encode_seconds += other.encode_seconds
+        self.write_seconds += other.write_seconds
+        self.errors += other.errors
+        self.queue_size = max(self.queue_size, other.queue_size)
+        self.queue_samples += other.queue_samples
+        self.queue_total += other.queue_total
+        self.queue_full += other.queue_full
+
+class FrameWriter:
+    """
+    Encodes and writes frames in a pool of writer threads while the caller keeps decoding.
+
+    cv2 releases the GIL while it encodes, so the decoder never waits for the JPEG encoder or
+    the disk. At most queue_size frames are waiting or being written, a full queue blocks the
+    caller until the oldest one is done, which keeps memory bounded on long videos.
+    """
+
+    def __init__(self, stats, writers=2, queue_size=8, image_format="jpg", quality=None):
+        """
+        :param stats: ExtractStats that gets the encode, write and queue figures
+        :param writers: Number of writer threads, 0 writes inline
+        :param queue_size: Maximum number of frames queued or in flight
+        :param image_format: Key of FORMAT_PARAMS, also the file extension
+        :param quality: Value for the format's FORMAT_PARAMS entry, None keeps the OpenCV default
+        """
+        if image_format not in FORMAT_PARAMS:
+            raise ValueError(f"Unknown image format '{image_format}', expected one of {tuple(FORMAT_PARAMS)}")
+        self.stats = stats
+        self.ext = "." + image_format
+        self.params = [FORMAT_PARAMS[image_format], int(quality)] if quality is not None else []
+        self.writers = writers
+        self.queue_size = max(queue_size, 1)
+        stats.queue_size = self.queue_size
+        self._pool = _executor(writers)
+        self._pending = deque()
+
+    def _write(self, path, frame):
+        begin = time.perf_counter()
+        ok, buffer = cv2.imencode(self.ext, frame, self.params)
+        if not ok:
+            raise ValueError(f"Could not encode frame as {self.ext}")
+        encoded = time.perf_counter()
+        with open(path, 'wb') as file:
+            file.write(buffer)
+        return encoded - begin, time.perf_counter() - encoded
+
+    def _finish(self, path, future):
+        try:
+            encode_seconds, write_seconds = future.result()
+        except Exception as e:
+            self.stats.errors += 1
+            print(f"Error writing '{path}': {e}")
+            return
+        self.stats.encoded += 1
+        self.stats.encode_seconds += encode_seconds
+        self.stats.write_seconds += write_seconds
+
+    def submit(self, path, frame):
+        """Queue a frame to be written to path, blocking while the queue is full."""
+        stats = self.stats
+        stats.queue_samples += 1
+        stats.queue_total += len(self._pending)
+        if len(self._pending) >= self.queue_size:
+            stats.queue_full += 1
+            while len(self._pending) >= self.queue_size:
+                self._finish(*self._pending.popleft())
+        self._pending.append((path, self._pool.submit(self._write, path, frame)))
+        if self.writers <= 0:
+            self._finish(*self._pending.popleft())
+
+    def close(self):
+        """Wait for every queued frame to be written."""
+        while self._pending:
+            self._finish(*self._pending.popleft())
+        self._pool.shutdown()
+
+class FrameDeduplicator:
+    """
+    Tells whether a frame is nearly identical to one of the last kept frames.
+
+    A frame's signature is a tiny grayscale copy (area-averaged, so sensor noise cancels out).
+    A frame is a duplicate when the mean absolute difference between its signature and that of
+    any of the last history kept frames is below threshold, in gray levels (0-255). A change
+    covering a fraction p of the picture with contrast c scores about p * c, so the threshold
+    decides how small an object may appear in front of a static camera and still count: sensor
+    noise scores around 0.3, a 40x100 object in a 640x360 frame around 1.2.
+    """
+
+    def __init__(self, threshold=1.0, history=8, size=(32, 32)):
+        """
+        :param threshold: Mean absolute difference below which two signatures count as the same scene
+        :param history: Number of kept frames to compare against, catches scenes that come back
+        :param size: (width, height) of the signature
+        """
+        self.threshold = threshold
+        self.size = size
+        self.recent = deque(maxlen=history)
+
+    def signature(self, frame):
+        # Shrink first, the colour conversion then only touches size pixels
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def is_duplicate(self, frame):
+        """True if frame matches a recent kept frame, otherwise remember it as kept and return False."""
+        signature = self.signature(frame)
+        limit = self.threshold * signature.size
+        for previous in self.recent:
+            if cv2.norm(signature, previous, cv2.NORM_L1) < limit:
+                return True
+        self.recent.append(signature)
+        return False
+
+def _advance(cap, position, target, seek_threshold, stats):
+    """
+    Move the capture so that the next grab() returns frame target. Returns the new position,
+    which is short of target only when the stream ended first, and the seek_threshold to use
+    from now on: None once the backend has seeked inexactly, so it is never asked again.
+    """
+    if seek_threshold is not None and target - position > seek_threshold:
+        # The backend seeks to the keyframe before target and decodes forward from there,
+        # only worth it when the gap is longer than the keyframe distance
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        landed = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if landed == target:
+            stats.seeks += 1
+            return target, seek_threshold
+        if not cap.grab():
+            return min(landed, target), seek_threshold  # Target is past the end of the stream
+        # Inexact seek, rewind and count frames from the start so the indices stay right. Later
+        # seeks would be just as inexact and rewinding each time is quadratic, so stop seeking
+        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        position = 0
+        seek_threshold = None
+
+    while position < target:
+        if not cap.grab():
+            return position, seek_threshold
+        stats.decoded += 1
+        position += 1
+    return position, seek_threshold
+
+def iter_frames(cap, interval, start=0, stop=None, seek_threshold=300, stats=None, dedup=None, gate=None):
+    """
+    Yield (frame index, BGR frame) for every interval-th frame of an opened capture, counted from
+    frame 0, within [start, stop).
+
+    Skipped frames are only grab()bed, never retrieve()d, so they skip the colour conversion and
+    copy. Gaps longer than seek_threshold frames are seeked over instead (None never seeks).
+    With gate (a quality.QualityGate), every frame is scored into stats.scores and frames that
+    fail it are counted and not yielded. The gate runs before dedup, so a rejected frame never
+    becomes the reference that later frames are compared against.
+    With dedup (a FrameDeduplicator), frames it reports as duplicates are counted and not yielded.
+    """
+    if stats is None:
+        stats = ExtractStats(cap.get(cv2.CAP_PROP_FPS))
+    # First frame to keep at or after start
+    target = -(-start // interval) * interval
+    position = 0
+    try:
+        while stop is None or target < stop:
+            position, seek_threshold = _advance(cap, position, target, seek_threshold, stats)
+            if position < target or not cap.grab():
+                break
+            stats.decoded += 1
+            position += 1
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            frame_index, target = target, target + interval
+            if gate is not None:
+                row = gate.check_frame(frame)
+                stats.scores.append({"frame": frame_index, **row})
+                if not row["passed"]:
+                    stats.rejected += 1
+                    continue
+            if dedup is not None and dedup.is_duplicate(frame):
+                stats.suppressed += 1
+                continue
+            stats.kept += 1
+            yield frame_index, frame
+    finally:
+        # A segment that reached its stop covered the whole range, even the frames it never had to grab
+        stats.covered = stop - start if stop is not None and target >= stop else max(position - start, 0)
+
+def letterbox_frame(frame, target_size):
+    """
+    Fit a BGR frame into target_size (width, height) keeping its aspect ratio, on a black canvas.
+    Same geometry as ResizeImg.resize_image_with_aspect_ratio, without the encode and re-decode.
+    """
+    paste_x, paste_y, new_width, new_height = letterbox_geometry((frame.shape[1], frame.shape[0]), target_size)
+    # Area averaging when shrinking, the usual case for video frames, Lanczos like ResizeImg when enlarging
+    interpolation = cv2.INTER_AREA if new_width < frame.shape[1] else cv2.INTER_LANCZOS4
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=interpolation)
+
+    canvas = np.zeros((target_size[1], target_size[0]) + frame.shape[2:], dtype=frame.dtype)
+    canvas[paste_y:paste_y + new_height, paste_x:paste_x + new_width] = resized
+    return canvas
+
+def frame_filename(video_path, frame_index, image_format="jpg"):
+    return f"{os.path.basename(video_path).split('.')[0]}_frame_{frame_index}.{image_format}"
+
+def probe_video(video_path):
+    """Return (fps, frame count) of a video, or None if it cannot be opened. The frame count may be an estimate."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        return None
+    fps, frame_count = cap.get(cv2.CAP_PROP_FPS), int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, frame_count
+
+def plan_segments(frame_count, interval, segment_frames):
+    """
+    Split a video into (start, stop) frame ranges of about segment_frames each.
+    Every start is a multiple of interval, so each segment keeps exactly the frames a serial run
+    keeps in that range. The last segment has no stop, a frame count that is only an estimate
+    cannot cut off the end of the video.
+    """
+    step = max(1, segment_frames // interval) * interval
+    starts = list(range(0, frame_count, step)) or [0]
+    return [(start, start + step) for start in starts[:-1]] + [(starts[-1], None)]
+
+def extract_segment(video_path, output_path, interval, start=0, stop=None, seek_threshold=300,
+                    dedup_threshold=None, dedup_history=8, letterbox=None, writers=2, queue_size=8,
+                    image_format="jpg", quality=None, quality_gate=None):
+    """
+    Save every interval-th frame of a video that falls in [start, stop) to output_path.
+    With dedup_threshold, near-duplicates of the last dedup_history saved frames are skipped (see FrameDeduplicator).
+    With letterbox, a (width, height) target, frames are letterboxed before they are written (see letterbox_frame).
+    Frames are encoded as image_format with the given quality by a FrameWriter with writers
+    threads and queue_size frames of backpressure. With quality_gate (a quality.QualityGate),
+    frames that fail it are not written, the scores of every frame are in the stats.
+    Returns the ExtractStats of the segment, or None if the video cannot be opened.
+    """
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error opening video stream or file: {video_path}")
+        return None
+
+    stats = ExtractStats(cap.get(cv2.CAP_PROP_FPS))
+    dedup = FrameDeduplicator(dedup_threshold, dedup_history) if dedup_threshold is not None else None
+    try:
+        writer = FrameWriter(stats, writers, queue_size, image_format, quality)
+    except ValueError:
+        cap.release()
+        raise
+    frames = iter_frames(cap, interval, start, stop, seek_threshold, stats, dedup, quality_gate)
+    try:
+        while True:
+            begin = time.perf_counter()
+            item = next(frames, None)
+            if item is not None and letterbox is not None:
+                item = item[0], letterbox_frame(item[1], letterbox)
+            stats.decode_seconds += time.perf_counter() - begin
+            if item is None:
+                break
+            frame_index, frame = item
+            # Save the frame 
+            writer.submit(os.path.join(output_path, frame_filename(video_path, frame_index, image_format)), frame)
+    finally:
+        writer.close()
+        cap.release()
+    stats.scores = [{"filename": frame_filename(video_path, row["frame"], image_format), **row} for row in stats.scores]
+    return stats
+
+def _output_path(output_dir):
     specific_folder = "datasets"
     full_output_path = os.path.join(output_dir, specific_folder)
 
     # if dir x exist
     if not os.path.exists(full_output_path):
         os.makedirs(full_output_path)
+    return full_output_path
 
-    cap = cv2.VideoCapture(video_path)
+def process_video(video_path, output_dir, seconds=2, seek_threshold=300, dedup_threshold=None, dedup_history=8,
+                  letterbox=None, writers=2, queue_size=8, image_format="jpg", quality=None, quality_gate=None,
+                  quality_index=None):
+    """
+    coding for proces single video file
+    
+    Parameters:
+    - video_path: The path to the video file.
+    - output_dir: The directory where the extracted frames will be saved.
+    - seconds: Keep one frame every this many seconds of video.
+    - seek_threshold: Seek instead of grabbing through gaps longer than this many frames, None never seeks.
+    - dedup_threshold: Skip frames whose downscaled signature differs from one of the last
+      dedup_history saved frames by less than this mean gray level (see FrameDeduplicator).
+      None saves every frame.
+    - letterbox: Optional (width, height), e.g. (640, 640). Frames are letterboxed in memory and
+      only the training-resolution image is written, no need for a ResizeImg pass afterwards.
+    - writers: Number of threads that encode and write frames while decoding carries on, 0 writes inline.
+    - queue_size: Maximum number of frames waiting to be written, keeps memory bounded.
+    - image_format: Output format, a key of FORMAT_PARAMS ("jpg", "png" or "webp").
+    - quality: Encoder setting for image_format (see FORMAT_PARAMS), None keeps the OpenCV default.
+    - quality_gate: Optional quality.QualityGate, blurred or badly exposed frames are dropped
+      before they are written.
+    - quality_index: Optional .csv or .parquet path for the quality scores of every frame.
+    """
+    if quality_gate is not None:
+        check_index_path(quality_index)
+    full_output_path = _output_path(output_dir)
 
     # Check video file open success
-    if not cap.isOpened():
+    probe = probe_video(video_path)
+    if probe is None:
         print(f"Error opening video stream or file: {video_path}")
         return
 
-    fps = cap.get(cv2.CAP_PROP_FPS)
-    frame_count =   0
-
     # Calc extract interval 
-    interval = int(fps * Second)
+    interval = max(1, int(probe[0] * seconds))
 
-    # Loop each frame of vid
-    print("now running")
-    
-    while True:
-        ret, frame = cap.read()
-
-        # Check frame read correct
-        if not ret:
-            print(f"Can't receive frame (stream end?). Exiting...")
-            break
-
-        # Extract frame use calc interval
-        if frame_count % interval ==   0:
-            # Construct the filename for the extracted frame
-            frame_filename = os.path.join(full_output_path, f"{os.path.basename(video_path).split('.')[0]}_frame_{frame_count}.jpg")
-            # Save the frame 
-            cv2.imwrite(frame_filename, frame)
+    stats = extract_segment(video_path, full_output_path, interval, seek_threshold=seek_threshold,
+                            dedup_threshold=dedup_threshold, dedup_history=dedup_history, letterbox=letterbox,
+                            writers=writers, queue_size=queue_size, image_format=image_format, quality=quality,
+                            quality_gate=quality_gate)
+    if stats is None:
+        return
+    if quality_index is not None and quality_gate is not None:
+        write_scores(stats.scores, quality_index)
 
-        frame_count +=   1
+    stats.report(os.path.basename(video_path))
+    print(f"Extracted {stats.kept} frames from {video_path} to {full_output_path}")
 
-    cap.release()
-    cv2.destroyAllWindows()
+def _init_worker():
+    # One OpenCV thread per process, the pool already keeps every core busy
+    cv2.setNumThreads(1)
 
-    print(f"Extracted {frame_count} frames from {video_path} to {full_output_path}")
+def process_videos_parallel(video_paths, output_dir, seconds=2, workers=None, segment_seconds=None,
+                            min_segment_seconds=30, seek_threshold=300, dedup_threshold=None, dedup_history=8,
+                            letterbox=None, writers=2, queue_size=8, image_format="jpg", quality=None,
+                            quality_gate=None, quality_index=None):
+    """
+    Extract frames from several videos at once in a process pool.
+
+    Every video is split into interval-aligned segments (see plan_segments) and each segment is
+    decoded by its own worker after seeking to its start, so one long recording also uses every
+    worker. Frame indices and filenames are the same as with process_video.
 
-def process_all_videos_in_folder(video_dir, output_dir):
+    Parameters:
+    - video_paths: Video files to extract from.
+    - output_dir: The directory where the extracted frames will be saved.
+    - seconds: Keep one frame every this many seconds of video.
+    - workers: Number of worker processes (default: os.cpu_count()).
+    - segment_seconds: Target segment length (default: the length of all videos divided by
+      workers, at least min_segment_seconds). 0 keeps every video in one piece.
+    - min_segment_seconds: Shortest automatic segment, every segment pays for one seek.
+    - seek_threshold: See iter_frames.
+    - dedup_threshold, dedup_history: See process_video. Deduplication compares every frame with
+      the ones saved before it, so videos are not split into segments when it is on.
+    - letterbox, writers, queue_size, image_format, quality, quality_gate, quality_index: See
+      process_video. writers and queue_size apply to every worker process.
+    """
+    if quality_gate is not None:
+        check_index_path(quality_index)
+    full_output_path = _output_path(output_dir)
+    start = time.perf_counter()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    probes = {}
+    for video_path in video_paths:
+        probe = probe_video(video_path)
+        if probe is None:
+            print(f"Error opening video stream or file: {video_path}")
+            continue
+        probes[video_path] = probe
+
+    if dedup_threshold is not None:
+        segment_seconds = 0
+    elif segment_seconds is None:
+        total_seconds = sum(frame_count / fps for fps, frame_count in probes.values() if fps > 0)
+        segment_seconds = max(total_seconds / workers, min_segment_seconds)
+
+    totals = {}
+    remaining = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        futures = {}
+        for video_path, (fps, frame_count) in probes.items():
+            interval = max(1, int(fps * seconds))
+            segments = [(0, None)]
+            if segment_seconds:
+                segments = plan_segments(frame_count, interval, int(fps * segment_seconds))
+
+            totals[video_path] = ExtractStats(fps)
+            remaining[video_path] = len(segments)
+            for segment_start, segment_stop in segments:
+                future = executor.submit(extract_segment, video_path, full_output_path, interval,
+                                         segment_start, segment_stop, seek_threshold,
+                                         dedup_threshold, dedup_history, letterbox,
+                                         writers, queue_size, image_format, quality, quality_gate)
+                futures[future] = video_path
+
+        for future in as_completed(futures):
+            video_path = futures[future]
+            try:
+                stats = future.result()
+                if stats is not None:
+                    totals[video_path].merge(stats)
+            except Exception as e:
+                print(f"Error extracting a segment of '{video_path}': {e}")
+            remaining[video_path] -= 1
+            if remaining[video_path] == 0:
+                # Wall time since the run started, segments of a video overlap with other videos
+                totals[video_path].report(os.path.basename(video_path))
+
+    elapsed = time.perf_counter() - start
+    kept = sum(stats.kept for stats in totals.values())
+    suppressed = sum(stats.suppressed for stats in totals.values())
+    video_seconds = sum(stats.covered / stats.fps for stats in totals.values() if stats.fps > 0)
+    factor = video_seconds / elapsed if elapsed > 0 else 0.0
+    print(f"Extracted {kept} frames from {len(totals)} videos to {full_output_path}: "
+          f"{video_seconds:.1f}s of video in {elapsed:.1f}s ({factor:.1f}x real time)")
+    if dedup_threshold is not None:
+        print(f"Suppressed {suppressed} near-duplicate frames")
+    if quality_gate is not None:
+        print(f"Rejected {sum(stats.rejected for stats in totals.values())} frames that failed the quality gate")
+        if quality_index is not None:
+            # Segments finish in any order, the index lists every video's frames in order
+            write_scores([row for video_path in totals
+                          for row in sorted(totals[video_path].scores, key=lambda row: row["frame"])], quality_index)
+
+def process_all_videos_in_folder(video_dir, output_dir, workers=1, dedup_threshold=None, letterbox=None):
     """
     Processes all video files in a specified directory
     
     Parameters:
     - video_dir: The directory containing the video files.
     - output_dir: The directory where the extracted frames will be saved.
+    - workers: Number of worker processes, more than 1 uses process_videos_parallel.
+    - dedup_threshold: Optional near-duplicate threshold, see process_video.
+    - letterbox: Optional (width, height) to letterbox frames to, see process_video.
     """
+    video_paths = []
     for filename in os.listdir(video_dir):
         # Check if the file is a video file
         if filename.endswith(".mp4"): 
-            video_path = os.path.join(video_dir, filename)
-            process_video(video_path, output_dir)
+            video_paths.append(os.path.join(video_dir, filename))
 
-def process_single_video(video_path, output_dir):
+    if workers > 1:
+        process_videos_parallel(video_paths, output_dir, workers=workers, dedup_threshold=dedup_threshold,
+                                letterbox=letterbox)
+        return
+    for video_path in video_paths:
+        process_video(video_path, output_dir, dedup_threshold=dedup_threshold, letterbox=letterbox)
+
+def process_single_video(video_path, output_dir, workers=1, dedup_threshold=None, letterbox=None):
     """
     Processes a single video file
     
     Parameters:
     - video_path: The path to the video file.
     - output_dir: The directory where the extracted frames will be saved.
+    - workers: Number of worker processes, more than 1 splits the video into segments.
+    - dedup_threshold: Optional near-duplicate threshold, see process_video.
+    - letterbox: Optional (width, height) to letterbox frames to, see process_video.
     """
-    process_video(video_path, output_dir)
+    if workers > 1:
+        process_videos_parallel([video_path], output_dir, workers=workers, dedup_threshold=dedup_threshold,
+                                letterbox=letterbox)
+        return
+    process_video(video_path, output_dir, dedup_threshold=dedup_threshold, letterbox=letterbox)
 
 if __name__ == "__main__":
     output_dir = "frames"
     # Uncomment below to process all videos in the folder
     #video_dir = r"C:\Users\Kygo\Desktop\2 NOV"
-    #process_all_videos_in_folder(video_dir, output_dir)
+    #process_all_videos_in_folder(video_dir, output_dir, workers=os.cpu_count())
     
     # Uncomment below to process a single video
     video_path = r"c:\Users\Kygo\Desktop\20231102\W20 Topside Pre-Fabrication Area-1 20231102 1615-1620.mp4"
     output_dir = r"C:\Users\Kygo\Desktop\extracted_frames"  
-    process_single_video(video_path, output_dir)
+    process_single_video(video_path, output_dir, workers=os.cpu_count())
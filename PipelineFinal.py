@@ -1,27 +1,112 @@
 import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import cv2
 import numpy as np
-from scipy.ndimage import gaussian_filter, map_coordinates
+from jitter import random_color_augmentation
+from stages import run_stages
+from shards import encode_image
+from decode_cache import DecodeCache
+from incremental import Manifest
+
+def dilate(gray_image, kernel_size=5, iterations=1):
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    return cv2.dilate(gray_image, kernel, iterations=iterations)
+
+def erode(gray_image, kernel_size=5, iterations=1):
+    kernel = np.ones((kernel_size, kernel_size), np.uint8)
+    return cv2.erode(gray_image, kernel, iterations=iterations)
 
 def dilate_image(image, kernel_size=5, iterations=1):
     gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    kernel = np.ones((kernel_size, kernel_size), np.uint8)
-    dilated_image = cv2.dilate(gray_image, kernel, iterations=iterations)
+    dilated_image = dilate(gray_image, kernel_size, iterations)
     return cv2.cvtColor(dilated_image, cv2.COLOR_GRAY2BGR)
 
 def erode_image(image, kernel_size=5, iterations=1):
     gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    kernel = np.ones((kernel_size, kernel_size), np.uint8)
-    eroded_image = cv2.erode(gray_image, kernel, iterations=iterations)
+    eroded_image = erode(gray_image, kernel_size, iterations)
     return cv2.cvtColor(eroded_image, cv2.COLOR_GRAY2BGR)
 
-def elastic_transform(image, alpha=120, sigma=12, alpha_affine=120, random_state=None):
+class DisplacementFieldBank:
+    """
+    Cache of pre-generated, smoothed elastic displacement fields keyed by image shape.
+
+    Smoothing a full-resolution noise field is the expensive part of an elastic transform,
+    so up to bank_size fields are kept per (height, width, alpha, sigma) and every image
+    samples one of them, randomly flipped and sign-inverted, instead of generating its own.
+
+    A bank grows one field at a time as draws land on empty slots, so a shape seen only once
+    costs a single field. The banks of all shapes together stay under max_bytes (a 1080p field
+    pair is about 16 MB), the least recently used shapes are dropped first and a shape that
+    alone fills the budget stops growing. Safe to share between threads.
+    """
+
+    def __init__(self, bank_size=16, max_bytes=256 << 20):
+        self.bank_size = bank_size
+        self.max_bytes = max_bytes
+        self.fields = OrderedDict()
+        self.nbytes = 0
+        self._lock = threading.Lock()
+
+    def _generate(self, height, width, alpha, sigma, random_state):
+        noise = random_state.uniform(-1, 1, size=(2, height, width)).astype(np.float32)
+        dx = cv2.GaussianBlur(noise[0], (0, 0), sigma, borderType=cv2.BORDER_REFLECT) * alpha
+        dy = cv2.GaussianBlur(noise[1], (0, 0), sigma, borderType=cv2.BORDER_REFLECT) * alpha
+        return dx, dy
+
+    def _make_room(self, needed):
+        # Drop least recently used shapes, the one being sampled was just moved to the end
+        while self.nbytes + needed > self.max_bytes and len(self.fields) > 1:
+            _, old_bank = self.fields.popitem(last=False)
+            self.nbytes -= sum(dx.nbytes + dy.nbytes for dx, dy in old_bank)
+        return self.nbytes + needed <= self.max_bytes
+
+    def sample(self, height, width, alpha, sigma, random_state):
+        """Return a (dx, dy) pair of float32 displacement fields for an image of the given size."""
+        key = (height, width, alpha, sigma)
+        with self._lock:
+            bank = self.fields.setdefault(key, [])
+            self.fields.move_to_end(key)
+            index = random_state.randint(self.bank_size)
+            if index >= len(bank):
+                needed = 2 * height * width * np.dtype(np.float32).itemsize
+                if self._make_room(needed) or not bank:
+                    bank.append(self._generate(height, width, alpha, sigma, random_state))
+                    self.nbytes += needed
+                    index = len(bank) - 1
+                else:
+                    index %= len(bank)
+            dx, dy = bank[index]
+
+        # Mirroring the field (and negating the matching component) yields another valid smooth field
+        if random_state.rand() < 0.5:
+            dx, dy = -dx[:, ::-1], dy[:, ::-1]
+        if random_state.rand() < 0.5:
+            dx, dy = dx[::-1, :], -dy[::-1, :]
+        if random_state.rand() < 0.5:
+            dx, dy = -dx, -dy
+        return dx, dy
+
+_field_bank = DisplacementFieldBank()
+
+def elastic_transform(image, alpha=120, sigma=12, alpha_affine=120, random_state=None, field_bank=None,
+                      return_matrix=False):
+    """
+    Random affine jitter followed by an elastic deformation, done in a single cv2.remap.
+
+    Works on grayscale and colour images alike. Displacement fields come from field_bank
+    (a shared DisplacementFieldBank by default), the affine part is drawn per image.
+    With return_matrix, returns (image, the 2x3 source-to-output affine matrix) so labels can follow.
+    """
     if random_state is None:
         random_state = np.random.RandomState(None)
+    if field_bank is None:
+        field_bank = _field_bank
 
-    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    shape = gray_image.shape
-    shape_size = shape[:2]
+    shape_size = image.shape[:2]
+    height, width = shape_size
 
     center_square = np.float32(shape_size) // 2
     square_size = min(shape_size) // 3
@@ -30,64 +115,288 @@ def elastic_transform(image, alpha=120, sigma=12, alpha_affine=120, random_state
                        center_square + np.float32([1, -1]) * square_size])
     pts2 = pts1 + random_state.uniform(-alpha_affine, alpha_affine, size=pts1.shape).astype(np.float32)
     M = cv2.getAffineTransform(pts1, pts2)
-    image = cv2.warpAffine(gray_image, M, shape_size[::-1], borderMode=cv2.BORDER_REFLECT_101)
 
-    dx = gaussian_filter((random_state.rand(*shape) * 2 - 1), sigma) * alpha
-    dy = gaussian_filter((random_state.rand(*shape) * 2 - 1), sigma) * alpha
+    dx, dy = field_bank.sample(height, width, alpha, sigma, random_state)
+
+    # The elastic field samples the affine-warped image at (x + dx, y + dy), which in turn samples
+    # the source at inverse(M) of that point, so both warps collapse into one remap
+    inverse = cv2.invertAffineTransform(M).astype(np.float32)
+    x = np.arange(width, dtype=np.float32)[np.newaxis, :] + dx
+    y = np.arange(height, dtype=np.float32)[:, np.newaxis] + dy
+    map_x = inverse[0, 0] * x + inverse[0, 1] * y + inverse[0, 2]
+    map_y = inverse[1, 0] * x + inverse[1, 1] * y + inverse[1, 2]
+
+    warped = cv2.remap(image, map_x, map_y, interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT_101)
+    if return_matrix:
+        return warped, M
+    return warped
+
+def to_gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+def to_hsv(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+
+class AugmentationGraph:
+    """
+    A set of augmentation branches that declare which intermediates they take as input.
+
+    "image" is the decoded BGR source. Other intermediates ("gray", "hsv" or any added with
+    add_intermediate) are computed at most once per image, the first time a branch asks for
+    them, and then handed to every branch that lists them. A branch's output is converted back
+    to BGR if it is single channel and passed through its finish step (colour jitter by default).
+    """
 
-    if len(shape) == 2:
-        x, y = np.meshgrid(np.arange(shape[1]), np.arange(shape[0]))
-        indices = np.reshape(y + dy, (-1, 1)), np.reshape(x + dx, (-1, 1))
-    else:
-        x, y, z = np.meshgrid(np.arange(shape[1]), np.arange(shape[0]), np.arange(shape[2]))
-        indices = np.reshape(y + dy, (-1, 1)), np.reshape(x + dx, (-1, 1)), np.reshape(z, (-1, 1))
+    def __init__(self):
+        self.intermediates = {
+            "gray": (to_gray, ("image",)),
+            "hsv": (to_hsv, ("image",)),
+        }
+        self.branches = []
 
-    distored_image = map_coordinates(image, indices, order=1, mode='reflect').reshape(shape)
+    def add_intermediate(self, name, func, inputs=("image",)):
+        """Register an intermediate computed as func(*inputs), where inputs name other intermediates."""
+        self.intermediates[name] = (func, tuple(inputs))
 
-    return cv2.cvtColor(distored_image, cv2.COLOR_GRAY2BGR)
+    def add_branch(self, prefix, func, inputs=("image",), finish=random_color_augmentation):
+        """Register a branch whose output is saved with the given filename prefix."""
+        for name in inputs:
+            if name != "image" and name not in self.intermediates:
+                raise ValueError(f"Unknown intermediate '{name}' for branch '{prefix}'")
+        self.branches.append((prefix, func, tuple(inputs), finish))
 
-def random_color_augmentation(image):
-    brightness_factor = np.random.uniform(0.5, 1.5)
-    image = cv2.convertScaleAbs(image, alpha=brightness_factor)
+    def _resolve(self, name, values):
+        if name not in values:
+            func, inputs = self.intermediates[name]
+            values[name] = func(*[self._resolve(input_name, values) for input_name in inputs])
+        return values[name]
 
-    contrast_factor = np.random.uniform(0.5, 1.5)
-    mean = np.mean(image)
-    image = cv2.addWeighted(image, contrast_factor, image, 0, -mean * (contrast_factor - 1))
+    def describe(self):
+        """JSON-serializable summary of the branches, used to notice graph changes between incremental runs."""
+        def name(func):
+            if func is None:
+                return None
+            qualname = getattr(func, "__qualname__", None)
+            return f"{func.__module__}.{qualname}" if qualname else repr(func)
 
-    saturation_factor = np.random.uniform(0.5, 1.5)
-    image_hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    image_hsv[:, :, 1] = np.clip(image_hsv[:, :, 1] * saturation_factor, 0, 255)
-    image = cv2.cvtColor(image_hsv, cv2.COLOR_HSV2BGR)
+        used = set()
+        def collect(inputs):
+            for input_name in inputs:
+                if input_name != "image" and input_name not in used:
+                    used.add(input_name)
+                    collect(self.intermediates[input_name][1])
 
-    hue_shift = np.random.uniform(-0.2, 0.2)
-    image_hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    image_hsv[:, :, 0] = np.clip(image_hsv[:, :, 0] + hue_shift * 180, 0, 179)
-    image = cv2.cvtColor(image_hsv, cv2.COLOR_HSV2BGR)
+        branches = []
+        for prefix, func, inputs, finish in self.branches:
+            collect(inputs)
+            branches.append([prefix, name(func), list(inputs), name(finish)])
+        intermediates = {input_name: [name(self.intermediates[input_name][0]), list(self.intermediates[input_name][1])]
+                         for input_name in sorted(used)}
+        return {"branches": branches, "intermediates": intermediates}
 
-    return image
+    def run(self, image):
+        """Run every branch on a decoded image. Returns a list of (prefix, BGR image) pairs."""
+        values = {"image": image}
+        outputs = []
+        for prefix, func, inputs, finish in self.branches:
+            output = func(*[self._resolve(name, values) for name in inputs])
+            if output.ndim == 2:
+                output = cv2.cvtColor(output, cv2.COLOR_GRAY2BGR)
+            if finish is not None:
+                output = finish(output)
+            outputs.append((prefix, output))
+        return outputs
 
-def process_images(input_dir, output_dir):
-    if not os.path.exists(output_dir):
+def build_default_graph():
+    """The dilated_, eroded_ and elastic_ branches that process_images has always produced."""
+    graph = AugmentationGraph()
+    graph.add_branch("dilated_", dilate, inputs=("gray",))
+    graph.add_branch("eroded_", erode, inputs=("gray",))
+    graph.add_branch("elastic_", elastic_transform, inputs=("image",))
+    return graph
+
+def encode_outputs(filename, outputs):
+    """Encode graph outputs as (key, {ext: bytes}) samples for a shards sink."""
+    stem, ext = os.path.splitext(filename)
+    return [(prefix + stem, {ext[1:]: encode_image(augmented_image, ext)}) for prefix, augmented_image in outputs]
+
+# One DecodeCache per cache folder and process, worker processes open their own
+_decode_caches = {}
+
+def get_decode_cache(cache_dir):
+    if cache_dir not in _decode_caches:
+        _decode_caches[cache_dir] = DecodeCache(cache_dir)
+    return _decode_caches[cache_dir]
+
+def read_image(image_path, cache_dir=None):
+    """Decode an image, through the DecodeCache in cache_dir if given."""
+    if cache_dir:
+        return get_decode_cache(cache_dir).load(image_path)
+    return cv2.imread(image_path, cv2.IMREAD_COLOR)
+
+def augment_file(filename, input_dir, output_dir, graph=None, encode=False, cache_dir=None):
+    """
+    Augment a single image and write its variants to output_dir.
+    With encode, the variants are returned as encoded samples instead of written.
+    Returns (worker pid, seconds spent, samples, cache hits, cache misses), samples is None if the
+    image could not be read. The cache counts are this image's DecodeCache lookups (0 without cache_dir).
+    """
+    start = time.perf_counter()
+    if graph is None:
+        graph = build_default_graph()
+
+    cache = get_decode_cache(cache_dir) if cache_dir else None
+    hits, misses = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    image_path = os.path.join(input_dir, filename)
+    image = read_image(image_path, cache_dir)
+    if cache is not None:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    if image is None:
+        print(f"Failed to read image: {image_path}")
+        return os.getpid(), time.perf_counter() - start, None, hits, misses
+
+    outputs = graph.run(image)
+    if encode:
+        return os.getpid(), time.perf_counter() - start, encode_outputs(filename, outputs), hits, misses
+
+    for prefix, augmented_image in outputs:
+        cv2.imwrite(os.path.join(output_dir, prefix + filename), augmented_image)
+
+    return os.getpid(), time.perf_counter() - start, [], hits, misses
+
+def _init_worker():
+    # Forked workers inherit the parent's NumPy RNG state, reseed so every worker draws its own augmentations
+    np.random.seed()
+    # One OpenCV thread per process, the pool already keeps every core busy
+    cv2.setNumThreads(1)
+
+def _print_worker_stats(worker_stats, elapsed, skipped=0, errors=0):
+    total = sum(count for count, _ in worker_stats.values())
+    for index, (pid, (count, busy)) in enumerate(sorted(worker_stats.items())):
+        rate = count / busy if busy > 0 else 0.0
+        print(f"Worker {index} (pid {pid}): {count} images in {busy:.1f}s ({rate:.2f} img/s)")
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Processed {total} images in {elapsed:.1f}s ({rate:.2f} img/s overall), "
+          f"{skipped} skipped, {errors} errors")
+
+def process_images(input_dir, output_dir, workers=1, queue_size=None, graph=None, readers=2, writers=2, sink=None,
+                   cache_dir=None, incremental=False):
+    """
+    Augment every image in input_dir and write one variant per graph branch to output_dir.
+
+    Parameters:
+    - input_dir: Directory containing the source images.
+    - output_dir: Directory where the augmented images will be saved.
+    - workers: Number of worker processes. 1 runs everything in this process, with decoding and
+      encoding overlapped in reader and writer threads (stages.run_stages).
+    - queue_size: Maximum number of images queued or in flight at once (default: 2 * workers,
+      8 with one worker), keeps memory flat on large datasets.
+    - graph: AugmentationGraph to run on each image (default: build_default_graph()).
+    - readers, writers: Reader and writer threads when workers is 1.
+    - sink: Optional shards.ShardWriter (or DirectoryWriter) to write the variants into instead of
+      output_dir. Worker processes encode, this process writes.
+    - cache_dir: Optional folder for a DecodeCache, later runs over the same sources skip the decode.
+    - incremental: Only augment images that are new or changed since the last incremental run into
+      output_dir, and delete the variants of images that were removed (see incremental.Manifest).
+    """
+    if incremental and sink is not None:
+        raise ValueError("incremental runs need output_dir, they cannot write into a sink")
+
+    if sink is None and not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    for filename in os.listdir(input_dir):
-        if filename.endswith(".jpg") or filename.endswith(".png"):
+    if graph is None:
+        graph = build_default_graph()
+
+    filenames = [f for f in os.listdir(input_dir) if f.endswith(".jpg") or f.endswith(".png")]
+
+    manifest = None
+    if incremental:
+        manifest = Manifest(output_dir, "PipelineFinal.process_images", graph.describe())
+        filenames = manifest.filter(input_dir, filenames)
+    prefixes = [branch[0] for branch in graph.branches]
+
+    if workers <= 1:
+        def read(filename):
             image_path = os.path.join(input_dir, filename)
-            image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+            image = read_image(image_path, cache_dir)
+            if image is None:
+                print(f"Failed to read image: {image_path}")
+            return image
+
+        def write(filename, outputs):
+            if sink is not None:
+                for key, files in encode_outputs(filename, outputs):
+                    sink.write_sample(key, files)
+                return
+            for prefix, augmented_image in outputs:
+                cv2.imwrite(os.path.join(output_dir, prefix + filename), augmented_image)
+            if manifest is not None:
+                manifest.record(os.path.join(input_dir, filename), [prefix + filename for prefix in prefixes])
+
+        run_stages(filenames, read, lambda filename, image: graph.run(image), write,
+                   readers, writers, queue_size or 8).report()
+        if cache_dir:
+            get_decode_cache(cache_dir).report()
+        if manifest is not None:
+            manifest.save()
+        return
+
+    if queue_size is None:
+        queue_size = 2 * workers
+
+    worker_stats = defaultdict(lambda: [0, 0.0])
+    # Unreadable images are skipped and exceptions are errors, as in stages.run_stages on the serial path
+    skipped = []
+    failed = []
+    cache_counts = [0, 0]  # Decode cache hits and misses summed over the workers
+    start = time.perf_counter()
+
+    def collect(done):
+        for future in done:
+            filename = pending.pop(future)
+            try:
+                pid, seconds, samples, hits, misses = future.result()
+                cache_counts[0] += hits
+                cache_counts[1] += misses
+                for key, files in samples or ():
+                    sink.write_sample(key, files)
+            except Exception as e:
+                print(f"Error processing image '{filename}': {e}")
+                failed.append(filename)
+                continue
+            if samples is None:
+                # Unreadable image, the worker already printed it
+                skipped.append(filename)
+                continue
+            if manifest is not None:
+                manifest.record(os.path.join(input_dir, filename), [prefix + filename for prefix in prefixes])
+            worker_stats[pid][0] += 1
+            worker_stats[pid][1] += seconds
 
-            dilated_image = dilate_image(image)
-            eroded_image = erode_image(image)
-            elastic_image = elastic_transform(image)
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for filename in filenames:
+            # Bounded work queue, wait for a slot before submitting more images
+            while len(pending) >= queue_size:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending[executor.submit(augment_file, filename, input_dir, output_dir, graph, sink is not None, cache_dir)] = filename
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
 
-            augmented_dilated_image = random_color_augmentation(dilated_image)
-            augmented_eroded_image = random_color_augmentation(eroded_image)
-            augmented_elastic_image = random_color_augmentation(elastic_image)
+    if manifest is not None:
+        manifest.save()
 
-            cv2.imwrite(os.path.join(output_dir, "dilated_" + filename), augmented_dilated_image)
-            cv2.imwrite(os.path.join(output_dir, "eroded_" + filename), augmented_eroded_image)
-            cv2.imwrite(os.path.join(output_dir, "elastic_" + filename), augmented_elastic_image)
+    if cache_dir:
+        # The workers' caches died with them, report their merged counts against the cache on disk
+        cache = DecodeCache(cache_dir)
+        cache.hits, cache.misses = cache_counts
+        cache.report()
+    _print_worker_stats(worker_stats, time.perf_counter() - start, len(skipped), len(failed))
 
 if __name__ == "__main__":
     input_dir = r'C:\Users\Kygo\Desktop\test'
     output_dir = r'c:\Users\Kygo\Desktop\new'
-    process_images(input_dir, output_dir)
\ No newline at end of file
+    process_images(input_dir, output_dir, workers=os.cpu_count())
\ No newline at end of file
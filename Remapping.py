@@ -1,7 +1,10 @@
+import glob
 import os
 import yaml
-import shutil
 from datetime import datetime
+from labelio import parse_labels, read_label_dir, format_labels, remap_class_ids, remap_label_lines
+from dataset_index import DatasetIndex
+from journal import Journal, atomic_write, atomic_copy, remove_partial
 
 def load_yaml_config(yaml_path):
     """
@@ -25,53 +28,50 @@ def find_max_class_in_annotations(input_folder):
     :param input_folder: Folder containing YOLO annotation text files
     :return: Highest class number found in the annotations
     """
-    max_class = -1
-    
-    for filename in os.listdir(input_folder):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(input_folder, filename)
-            
-            with open(file_path, 'r') as file:
-                for line in file:
-                    # Split and clean the line
-                    parts = line.strip().split()
-                    if parts:
-                        try:
-                            # Try to extract the class number, handling different formats
-                            class_part = parts[0]
-                            
-                            # Remove any ':' or other non-numeric characters
-                            class_num = int(''.join(filter(str.isdigit, class_part)))
-                            
-                            max_class = max(max_class, class_num)
-                        except (ValueError, IndexError):
-                            # Skip lines that can't be parsed
-                            print(f"Warning: Could not parse line in {filename}: {line.strip()}")
-    
-    return max_class
+    errors = []
+    _, class_ids, _, _ = read_label_dir(input_folder, errors)
+    for file_path, _, line in errors:
+        # Skip lines that can't be parsed
+        print(f"Warning: Could not parse line in {os.path.basename(file_path)}: {line}")
+
+    return int(class_ids.max()) if len(class_ids) else -1
 
 def remap_class_annotations(input_folder,       # Folder with annotation files #
     yaml_path,          # Path to the YAML configuration file
     class_mapping=None, # Optional: Custom class mapping
     add_new_classes=None, # Optional: List of new classes to add
     output_base=None,
-    copy_images=True   # New parameter to control image copying
+    copy_images=True,   # New parameter to control image copying
+    index_cache=False,  # Reuse the cached file listing while the folder is unchanged
+    resume=False        # Carry on in the latest output directory instead of starting a new one
 ):
     """
     Modify class annotations and create a new output directory with remapped files.
+    Labels and images are looked up in a single-scan DatasetIndex of input_folder.
+    Every file is written to a temporary name and renamed into place, and every finished step is
+    appended to .journal-remap.jsonl in the output directory. With resume, the latest
+    remapped_annotations_* directory is reused and the steps in its journal are skipped. The YAML
+    update is journaled with the configuration it started from, so new classes are only added once.
     
     Returns:
     - Path to the new output directory
     - Path to the new classes.txt file
     """
-    # Create a timestamped output directory
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     output_base = os.path.dirname(input_folder)
-    output_folder = os.path.join(output_base, f"remapped_annotations_{timestamp}")
-    os.makedirs(output_folder, exist_ok=True)
-    
-    # Load the current class configuration from YAML
-    config = load_yaml_config(yaml_path)
+    previous = sorted(glob.glob(os.path.join(glob.escape(output_base), "remapped_annotations_*"))) if resume else []
+    if previous:
+        output_folder = previous[-1]
+        removed = remove_partial(output_folder)
+        print(f"Resuming in {output_folder}" + (f", removed {removed} partially written files" if removed else ""))
+    else:
+        # Create a timestamped output directory
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_folder = os.path.join(output_base, f"remapped_annotations_{timestamp}")
+        os.makedirs(output_folder, exist_ok=True)
+    journal = Journal(os.path.join(output_folder, ".journal-remap.jsonl"), resume)
+    
+    # Load the current class configuration from YAML, as it was before an earlier run updated it
+    config = journal.get("yaml") or load_yaml_config(yaml_path)
     
     # Create a default 1:1 mapping if no custom mapping provided
     if class_mapping is None:
@@ -101,6 +101,9 @@ def remap_class_annotations(input_folder,       # Folder with annotation files #
             class_mapping[config['num_classes'] + i] = new_class_start + i
             class_names.append(new_class_name)
         
+    if add_new_classes and "yaml" in journal:
+        print(f"New classes were already added by the interrupted run: {add_new_classes}")
+    elif add_new_classes:
         # Update the YAML configuration file
         with open(yaml_path, 'r') as file:
             yaml_config = yaml.safe_load(file)
@@ -110,66 +113,64 @@ def remap_class_annotations(input_folder,       # Folder with annotation files #
         yaml_config['names'].extend(add_new_classes)
         
         # Write updated configuration back to the YAML file
-        with open(yaml_path, 'w') as file:
-            yaml.dump(yaml_config, file)
+        atomic_write(yaml_path, yaml.dump(yaml_config))
+        journal.mark_done("yaml", config)
         
         print(f"Added new classes: {add_new_classes}")
     
     # Create classes.txt file in the output directory
     classes_txt_path = os.path.join(output_folder, 'classes.txt')
-    with open(classes_txt_path, 'w') as f:
-        for idx, (orig_name, mapped_class) in enumerate(
-            zip(class_names, range(len(class_names)))
-        ):
-            # Find the original class that maps to this new class number
-            original_class = next(
-                (orig for orig, mapped in class_mapping.items() 
-                 if mapped == mapped_class), 
-                mapped_class
-            )
-            f.write(f"{mapped_class}: {orig_name} (originally class {original_class})\n")
+    lines = []
+    for idx, (orig_name, mapped_class) in enumerate(
+        zip(class_names, range(len(class_names)))
+    ):
+        # Find the original class that maps to this new class number
+        original_class = next(
+            (orig for orig, mapped in class_mapping.items() 
+             if mapped == mapped_class), 
+            mapped_class
+        )
+        lines.append(f"{mapped_class}: {orig_name} (originally class {original_class})\n")
+    atomic_write(classes_txt_path, "".join(lines))
     
+    index = DatasetIndex(input_folder, cache=index_cache)
+
     # Process each annotation file and copy to new directory
-    for filename in os.listdir(input_folder):
-        if filename.endswith('.txt'):
-            file_path = os.path.join(input_folder, filename)
-            output_path = os.path.join(output_folder, filename)
-            
-            # Read existing annotations
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
-            
-            # Remap class annotations
-            remapped_lines = []
-            for line in lines:
-                parts = line.strip().split()
-                if parts:
-                    # Extract only digits from the first part
-                    original_class = int(''.join(filter(str.isdigit, parts[0])))
-                    
-                    # Change class number if it's in the mapping
-                    if original_class in class_mapping:
-                        parts[0] = str(class_mapping[original_class])
-                    
-                    # Reconstruct the line with new class number
-                    remapped_lines.append(' '.join(parts) + '\n')
-            
-            # Write updated annotations to the new file
-            with open(output_path, 'w') as file:
-                file.writelines(remapped_lines)
+    for stem, file_path in index.labels():
+        if stem.startswith('classes') or f"label:{stem}" in journal:
+            continue
+        output_path = os.path.join(output_folder, os.path.basename(file_path))
+        
+        # Read existing annotations
+        with open(file_path, 'r') as file:
+            text = file.read()
+        errors = []
+        class_ids, boxes = parse_labels(text, file_path, errors)
+        
+        # Remap class annotations, classes missing from the mapping keep their number
+        if not errors:
+            class_ids, _ = remap_class_ids(class_ids, class_mapping)
+            text = format_labels(class_ids, boxes)
+        else:
+            # Not every line is a box (e.g. polygons), remap line by line and keep the other fields as written
+            errors = []
+            text, _ = remap_label_lines(text, class_mapping, file_path, errors)
+            for source, line_num, line in errors:
+                print(f"Kept unchanged, class is not a whole number: {source}:{line_num}: {line}")
         
-        # Copy corresponding images if they exist
-        if copy_images:
-            # Try different image extensions
-            image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-            base_filename = os.path.splitext(filename)[0]
-            
-            for ext in image_extensions:
-                image_path = os.path.join(input_folder, base_filename + ext)
-                if os.path.exists(image_path):
-                    shutil.copy2(image_path, output_folder)
-                    print(f"Copied image: {base_filename + ext}")
-                    break
+        # Write updated annotations to the new file
+        atomic_write(output_path, text)
+        journal.mark_done(f"label:{stem}")
+    
+    # Copy the images, one per stem with the preferred extension
+    if copy_images:
+        for stem, image_path in index.images():
+            if f"image:{stem}" in journal:
+                continue
+            atomic_copy(image_path, os.path.join(output_folder, os.path.basename(image_path)), metadata=True)
+            journal.mark_done(f"image:{stem}")
+            print(f"Copied image: {os.path.basename(image_path)}")
+    journal.close()
     
     print(f"Class annotations remapped successfully!")
     print(f"\n🗂️ Output Directory: {output_folder}")
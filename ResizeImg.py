@@ -1,10 +1,12 @@
 from PIL import Image
 import os
 import shutil
+from boxes import compose, scale_matrix, translation_matrix, transform_boxes
+from labelio import parse_labels, format_labels, read_labels, write_labels
 
-def resize_image_with_aspect_ratio(image, target_size):
-    """Resize image maintaining aspect ratio and filling with black if necessary."""
-    aspect_ratio = image.width / image.height
+def letterbox_geometry(image_size, target_size):
+    """Return (paste_x, paste_y, new_width, new_height) for fitting image_size into target_size."""
+    aspect_ratio = image_size[0] / image_size[1]
     target_aspect = target_size[0] / target_size[1]
 
     if aspect_ratio > target_aspect:
@@ -16,39 +18,60 @@ def resize_image_with_aspect_ratio(image, target_size):
         new_height = target_size[1]
         new_width = int(new_height * aspect_ratio)
 
+    paste_x = (target_size[0] - new_width) // 2
+    paste_y = (target_size[1] - new_height) // 2
+    return paste_x, paste_y, new_width, new_height
+
+def open_for_resize(image_path, target_size, fast_decode=True):
+    """
+    Open an image for letterboxing to target_size. Returns (image, original_size).
+
+    With fast_decode, a JPEG much larger than its letterboxed size is decoded at 1/2, 1/4 or 1/8
+    scale straight from the DCT coefficients (Image.draft), which skips most of the decode work.
+    The reduced image is never smaller than the letterboxed size, the final LANCZOS resize
+    still sets the output. original_size is the full size, the annotations are relative to it.
+    """
+    image = Image.open(image_path)
+    original_size = image.size
+    if fast_decode:
+        _, _, new_width, new_height = letterbox_geometry(original_size, target_size)
+        image.draft('RGB', (new_width, new_height))  # No-op for anything but JPEG
+    return image, original_size
+
+def resize_image_with_aspect_ratio(image, target_size, original_size=None):
+    """
+    Resize image maintaining aspect ratio and filling with black if necessary.
+    original_size is the size to compute the letterbox from if image was opened with a reduced draft.
+    """
+    paste_x, paste_y, new_width, new_height = letterbox_geometry(original_size or image.size, target_size)
+
     resized_image = image.resize((new_width, new_height), Image.LANCZOS)
 
     new_image = Image.new("RGB", target_size, (0, 0, 0))
-    paste_x = (target_size[0] - new_width) // 2
-    paste_y = (target_size[1] - new_height) // 2
     new_image.paste(resized_image, (paste_x, paste_y))
 
     return new_image, (paste_x, paste_y, new_width, new_height)
 
-def adjust_annotations(annotations, original_size, new_size, paste_info):
-    """Adjust YOLO format annotations after resizing."""
+def adjust_boxes(boxes, original_size, new_size, paste_info):
+    """Adjust an N x 4 array of YOLO boxes after resizing. Returns (boxes, keep mask)."""
     orig_w, orig_h = original_size
-    new_w, new_h = new_size
     paste_x, paste_y, resized_w, resized_h = paste_info
 
-    adjusted_annotations = []
-    for annotation in annotations:
-        class_id, x_center, y_center, width, height = map(float, annotation.split())
-        
-        # Adjust for resizing and padding
-        x_center = (x_center * orig_w * resized_w / orig_w + paste_x) / new_w
-        y_center = (y_center * orig_h * resized_h / orig_h + paste_y) / new_h
-        width = width * resized_w / new_w
-        height = height * resized_h / new_h
-
-        adjusted_annotations.append(f"{int(class_id)} {x_center} {y_center} {width} {height}")
+    # Adjust for resizing and padding: scale to the resized size, then shift by the paste offset
+    matrix = compose(scale_matrix(resized_w / orig_w, resized_h / orig_h), translation_matrix(paste_x, paste_y))
+    return transform_boxes(boxes, matrix, original_size, new_size)
 
-    return adjusted_annotations
+def adjust_annotations(annotations, original_size, new_size, paste_info):
+    """Adjust YOLO format annotations after resizing."""
+    class_ids, boxes = parse_labels('\n'.join(annotations))
+    adjusted, keep = adjust_boxes(boxes, original_size, new_size, paste_info)
+    return format_labels(class_ids[keep], adjusted).splitlines()
 
-def resize_images(image_dir, resized_dir, size=(640, 640)):
+def resize_images(image_dir, resized_dir, size=(640, 640), fast_decode=True):
     """
     Resizes images in the given directory to the specified size, maintaining aspect ratio,
     and adjusts corresponding .txt files with YOLO format annotations.
+    fast_decode lets large JPEGs decode at reduced resolution, see open_for_resize.
     """
     try:
         if not os.path.exists(resized_dir):
@@ -58,10 +81,9 @@ def resize_images(image_dir, resized_dir, size=(640, 640)):
             try:
                 if filename.lower().endswith((".png", ".jpg", ".jpeg")):
                     img_path = os.path.join(image_dir, filename)
-                    img = Image.open(img_path)
-                    original_size = img.size
+                    img, original_size = open_for_resize(img_path, size, fast_decode)
 
-                    resized_img, paste_info = resize_image_with_aspect_ratio(img, size)
+                    resized_img, paste_info = resize_image_with_aspect_ratio(img, size, original_size)
 
                     resized_img.save(os.path.join(resized_dir, filename), quality=95)
 
@@ -69,13 +91,11 @@ def resize_images(image_dir, resized_dir, size=(640, 640)):
                     txt_filename = os.path.splitext(filename)[0] + ".txt"
                     txt_path = os.path.join(image_dir, txt_filename)
                     if os.path.exists(txt_path):
-                        with open(txt_path, 'r') as f:
-                            annotations = f.read().strip().split('\n')
-                        
-                        adjusted_annotations = adjust_annotations(annotations, original_size, size, paste_info)
-                        
-                        with open(os.path.join(resized_dir, txt_filename), 'w') as f:
-                            f.write('\n'.join(adjusted_annotations))
+                        class_ids, boxes = read_labels(txt_path)
+
+                        adjusted, keep = adjust_boxes(boxes, original_size, size, paste_info)
+
+                        write_labels(os.path.join(resized_dir, txt_filename), class_ids[keep], adjusted)
 
             except Exception as e:
                 print(f"Error processing image '{filename}': {e}")
@@ -1 +1,148 @@
-from models.yolo import Model
\ No newline at end of file
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from medianf import apply_bilateral_filter
+from sharpenbasic import sharpen_image
+
+# Filters a chain can name, each takes and returns a BGR frame
+FILTERS = {
+    "bilateral": apply_bilateral_filter,
+    "sharpen": sharpen_image,
+}
+
+def build_chain(filters):
+    """Turn a list of FILTERS names or callables (e.g. functools.partial with custom settings) into callables."""
+    chain = []
+    for item in filters:
+        if callable(item):
+            chain.append(item)
+        elif item in FILTERS:
+            chain.append(FILTERS[item])
+        else:
+            raise ValueError(f"Unknown filter '{item}', expected one of {tuple(FILTERS)} or a callable")
+    return chain
+
+def apply_chain(frame, chain):
+    for func in chain:
+        frame = func(frame)
+    return frame
+
+class EnhanceStats:
+    """Frame counts and timings of one enhancement run."""
+
+    def __init__(self, fps):
+        self.fps = fps
+        self.frames = 0
+        self.errors = 0
+        self.read_seconds = 0.0
+        self.write_seconds = 0.0
+        self.peak_buffer = 0
+        self.elapsed = 0.0
+
+    def report(self, name):
+        video_seconds = self.frames / self.fps if self.fps > 0 else 0.0
+        rate = self.frames / self.elapsed if self.elapsed > 0 else 0.0
+        factor = video_seconds / self.elapsed if self.elapsed > 0 else 0.0
+        print(f"{name}: enhanced {self.frames} frames ({video_seconds:.1f}s of video) in {self.elapsed:.1f}s, "
+              f"{rate:.1f} fps ({factor:.2f}x real time), {self.errors} errors")
+        print(f"Read {self.read_seconds:.1f}s, write {self.write_seconds:.1f}s, "
+              f"reorder buffer peaked at {self.peak_buffer} frames")
+
+def enhance_video(input_path, output_path, filters=("bilateral", "sharpen"), workers=None, queue_size=None,
+                  fourcc="mp4v"):
+    """
+    Stream a video through a filter chain into a new video, without writing any frames to disk.
+
+    Frames are decoded in this thread and filtered in a thread pool (OpenCV releases the GIL, so
+    the filters of several frames run at once). Finished frames wait in a reorder buffer until
+    every earlier frame is done and are then written in their original order. At most
+    queue_size frames are in flight, a full buffer blocks the decoder, which bounds memory.
+    The output keeps the input's frame rate and size. Audio is not copied.
+
+    Parameters:
+    - input_path: Video to enhance.
+    - output_path: Video to write, its container comes from the extension (e.g. .mp4, .avi).
+    - filters: Filter chain applied to every frame in order, FILTERS names or callables.
+    - workers: Number of filter threads (default: os.cpu_count()).
+    - queue_size: Maximum number of frames in flight (default: 2 * workers).
+    - fourcc: Four character code of the output codec.
+
+    Returns:
+    - EnhanceStats of the run, or None if the input or output cannot be opened.
+    """
+    chain = build_chain(filters)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if queue_size is None:
+        queue_size = 2 * workers
+
+    cap = cv2.VideoCapture(input_path)
+    if not cap.isOpened():
+        print(f"Error opening video stream or file: {input_path}")
+        return None
+
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, size)
+    if not writer.isOpened():
+        print(f"Error opening video writer: {output_path}")
+        cap.release()
+        return None
+
+    stats = EnhanceStats(fps)
+    start = time.perf_counter()
+    # Futures in frame order, the head is written as soon as it is done
+    buffer = deque()
+
+    def write_head():
+        index, frame, future = buffer.popleft()
+        try:
+            frame = future.result()
+        except Exception as e:
+            # Keep the timeline intact, a frame that fails to filter is written unfiltered
+            stats.errors += 1
+            print(f"Error filtering frame {index}: {e}")
+        begin = time.perf_counter()
+        writer.write(frame)
+        stats.write_seconds += time.perf_counter() - begin
+        stats.frames += 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        index = 0
+        while True:
+            begin = time.perf_counter()
+            ret, frame = cap.read()
+            stats.read_seconds += time.perf_counter() - begin
+            if not ret:
+                break
+            buffer.append((index, frame, pool.submit(apply_chain, frame, chain)))
+            stats.peak_buffer = max(stats.peak_buffer, len(buffer))
+            index += 1
+            # Write every frame that is ready in order, wait on the head only when the buffer is full
+            while buffer and (buffer[0][2].done() or len(buffer) >= queue_size):
+                write_head()
+        while buffer:
+            write_head()
+
+    cap.release()
+    writer.release()
+    stats.elapsed = time.perf_counter() - start
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enhance a video frame by frame with a filter chain.")
+    parser.add_argument("input", help="Video to enhance")
+    parser.add_argument("output", help="Enhanced video to write")
+    parser.add_argument("--filters", nargs="+", default=["bilateral", "sharpen"], choices=sorted(FILTERS),
+                        help="Filter chain, applied in the given order")
+    parser.add_argument("--workers", type=int, default=None, help="Filter threads (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=None, help="Frames in flight (default: 2 * workers)")
+    parser.add_argument("--fourcc", default="mp4v", help="Output codec")
+    args = parser.parse_args()
+
+    stats = enhance_video(args.input, args.output, args.filters, args.workers, args.queue_size, args.fourcc)
+    if stats is not None:
+        stats.report(os.path.basename(args.input))
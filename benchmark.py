@@ -0,0 +1,361 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+from labelio import write_labels
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def generate_dataset(output_dir, count=50, size=(640, 640), boxes_per_image=5, seed=0):
+    """
+    Write a synthetic YOLO dataset: smooth noise images with filled rectangles and their label files.
+
+    Parameters:
+    - output_dir: Folder to create the images and .txt labels in.
+    - count: Number of images.
+    - size: (width, height) of every image.
+    - boxes_per_image: Number of labelled rectangles drawn on each image.
+    - seed: Random seed, the same seed gives the same dataset.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.RandomState(seed)
+    width, height = size
+    for i in range(count):
+        # Blurred noise compresses and filters like a photo rather than like static
+        image = cv2.GaussianBlur(rng.randint(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+
+        boxes = np.empty((boxes_per_image, 4), dtype=np.float32)
+        boxes[:, 2:] = rng.uniform(0.05, 0.3, (boxes_per_image, 2))
+        boxes[:, :2] = boxes[:, 2:] / 2 + rng.uniform(0, 1, (boxes_per_image, 2)) * (1 - boxes[:, 2:])
+        for xc, yc, w, h in boxes:
+            top_left = (int((xc - w / 2) * width), int((yc - h / 2) * height))
+            bottom_right = (int((xc + w / 2) * width), int((yc + h / 2) * height))
+            color = tuple(int(c) for c in rng.randint(0, 256, 3))
+            cv2.rectangle(image, top_left, bottom_right, color, -1)
+
+        name = f"synthetic_{i:05d}"
+        cv2.imwrite(os.path.join(output_dir, name + ".jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 95])
+        class_ids = rng.randint(0, 5, boxes_per_image)
+        write_labels(os.path.join(output_dir, name + ".txt"), class_ids, boxes)
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and its finished children in MB, None where unsupported.
+    It covers the whole life of the process and never goes down, so within one process it is a
+    running maximum over everything that ran so far, not the peak of the last benchmark.
+    """
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def own_peak_rss_mb():
+    """
+    Peak resident set size in MB of what ran in this process (and its finished children) alone.
+    On Linux ru_maxrss carries over the RSS of the parent a process was forked and exec'd from,
+    VmHWM belongs to the memory map that exec replaced and starts afresh. Elsewhere: peak_rss_mb().
+    """
+    try:
+        with open("/proc/self/status", "r") as file:
+            own = next(int(line.split()[1]) for line in file if line.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration, ValueError):
+        return peak_rss_mb()
+    return max(own, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024)
+
+def to_pil(image):
+    return Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+def to_rgb_batch(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)[None]
+
+def get_ops():
+    """
+    Return the single-image ops as (name, prepare, func) tuples.
+    prepare turns a decoded BGR image into the op's input and is not timed.
+    """
+    from PipelineFinal import dilate_image, erode_image, elastic_transform, build_default_graph
+    from jitter import random_color_augmentation
+    from sharpenbasic import sharpen_image
+    from medianf import apply_bilateral_filter
+    from colour import augment_image, augment_batch
+    from ResizeImg import resize_image_with_aspect_ratio
+
+    graph = build_default_graph()
+    return [
+        ("PipelineFinal.dilate_image", None, dilate_image),
+        ("PipelineFinal.erode_image", None, erode_image),
+        ("PipelineFinal.elastic_transform", None, elastic_transform),
+        ("PipelineFinal.AugmentationGraph.run", None, graph.run),
+        ("jitter.random_color_augmentation", None, random_color_augmentation),
+        ("sharpenbasic.sharpen_image", None, sharpen_image),
+        ("medianf.apply_bilateral_filter", None, apply_bilateral_filter),
+        ("colour.augment_image", to_pil, augment_image),
+        ("colour.augment_batch", to_rgb_batch, augment_batch),
+        ("ResizeImg.resize_image_with_aspect_ratio", to_pil,
+         lambda image: resize_image_with_aspect_ratio(image, (640, 640))),
+    ]
+
+def get_entry_points(workers):
+    """Return the end-to-end entry points as (name, func(input_dir, output_dir)) tuples."""
+    import PipelineFinal
+    import jitter
+    import sharpenbasic
+    import colour
+    import ResizeImg
+    import flip
+    import pad
+
+    return [
+        ("PipelineFinal.process_images", lambda i, o: PipelineFinal.process_images(i, o, workers=workers)),
+        ("jitter.process_images_and_texts", jitter.process_images_and_texts),
+        ("sharpenbasic.process_images_and_texts", sharpenbasic.process_images_and_texts),
+        ("colour.process_directory", colour.process_directory),
+        ("colour.process_directory(batch_size=32)", lambda i, o: colour.process_directory(i, o, batch_size=32)),
+        ("ResizeImg.resize_images", ResizeImg.resize_images),
+        ("flip.process_directory", flip.process_directory),
+        ("pad.process_directory", pad.process_directory),
+    ]
+
+def psnr(a, b):
+    """Peak signal-to-noise ratio of two uint8 images in dB."""
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255 ** 2 / mse))
+
+def benchmark_resize_decode(data_dir, target_size=(640, 640), repeats=3):
+    """
+    Compare ResizeImg's full decode + LANCZOS resize with the reduced-resolution JPEG decode.
+    Returns {name: stats} with the PSNR of the fast output against the full one.
+
+    The reduced decode only kicks in for JPEGs at least twice the letterboxed size, so data_dir
+    should hold large images (main generates 1920x1080 ones for this section).
+    """
+    from ResizeImg import open_for_resize, resize_image_with_aspect_ratio, letterbox_geometry
+
+    paths = [os.path.join(data_dir, f) for f in sorted(os.listdir(data_dir)) if f.endswith(".jpg")]
+    with Image.open(paths[0]) as image:
+        _, _, new_width, _ = letterbox_geometry(image.size, target_size)
+        if image.width < 2 * new_width:
+            print(f"Warning: {image.width}x{image.height} images are too small for a reduced decode to "
+                  f"{target_size[0]}x{target_size[1]}, both rows measure the same work")
+
+    def run(path, fast_decode):
+        image, original_size = open_for_resize(path, target_size, fast_decode)
+        return resize_image_with_aspect_ratio(image, target_size, original_size)[0]
+
+    results = {}
+    for name, fast_decode in (("ResizeImg.full_decode", False), ("ResizeImg.draft_decode", True)):
+        latencies = []
+        for _ in range(repeats):
+            for path in paths:
+                start = time.perf_counter()
+                run(path, fast_decode)
+                latencies.append(time.perf_counter() - start)
+        results[name] = summarize(latencies)
+        results[name]["process_peak_rss_mb"] = peak_rss_mb()
+        print_row(name, results[name])
+
+    scores = [psnr(run(path, False), run(path, True)) for path in paths]
+    results["ResizeImg.draft_decode"]["psnr_db"] = float(np.mean(scores))
+    print(f"Draft decode PSNR against full decode: mean {np.mean(scores):.2f} dB, min {np.min(scores):.2f} dB, "
+          f"speedup {results['ResizeImg.draft_decode']['images_per_sec'] / results['ResizeImg.full_decode']['images_per_sec']:.2f}x")
+    return results
+
+def summarize(latencies):
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p90_ms": float(np.percentile(latencies, 90)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "images_per_sec": float(1000 / latencies.mean()),
+    }
+
+def benchmark_ops(data_dir, repeats=3, only=None):
+    """Time every op on every image of data_dir repeats times. Returns {name: stats}."""
+    images = [cv2.imread(os.path.join(data_dir, f)) for f in sorted(os.listdir(data_dir)) if f.endswith(".jpg")]
+    results = {}
+    for name, prepare, func in get_ops():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        inputs = [prepare(image) if prepare else image for image in images]
+        latencies = []
+        try:
+            func(inputs[0])  # Warm-up, lazily built tables and caches are not part of the steady state
+            for _ in range(repeats):
+                for item in inputs:
+                    start = time.perf_counter()
+                    func(item)
+                    latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            print(f"{name}: failed ({e})")
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = summarize(latencies)
+        results[name]["process_peak_rss_mb"] = peak_rss_mb()
+        print_row(name, results[name])
+    return results
+
+def _run_entry_point(name, data_dir, workers):
+    # Runs in a fresh process, so its peak is the peak of this entry point alone
+    func = dict(get_entry_points(workers))[name]
+    output_dir = tempfile.mkdtemp(prefix="bench_out_")
+    try:
+        # The scripts report every file, keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func(data_dir, output_dir)
+            elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+    return elapsed, own_peak_rss_mb()
+
+def benchmark_entry_points(data_dir, workers=1, only=None):
+    """
+    Run every entry point once on data_dir into a scratch folder, each in its own fresh process
+    so its peak RSS is not inherited from whatever ran before. Returns {name: stats}.
+    """
+    count = sum(1 for f in os.listdir(data_dir) if f.endswith(".jpg"))
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for name, _ in get_entry_points(workers):
+        if only and not any(pattern in name for pattern in only):
+            continue
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                elapsed, peak = executor.submit(_run_entry_point, name, data_dir, workers).result()
+        except Exception as e:
+            print(f"{name}: failed ({e})")
+            results[name] = {"error": str(e)}
+            continue
+        results[name] = {
+            "seconds": elapsed,
+            "images_per_sec": count / elapsed,
+            "peak_rss_mb": peak,
+        }
+        print_row(name, results[name])
+    return results
+
+def print_row(name, stats):
+    # Entry points report their own peak, ops only the running peak of the benchmark process
+    if "peak_rss_mb" in stats:
+        label, rss = "peak RSS", stats["peak_rss_mb"]
+    else:
+        label, rss = "process peak RSS", stats.get("process_peak_rss_mb")
+    rss = f"{rss:8.1f} MB" if rss is not None else "     n/a"
+    if "p50_ms" in stats:
+        print(f"{name:45s} {stats['images_per_sec']:9.1f} img/s  p50 {stats['p50_ms']:8.2f} ms  "
+              f"p90 {stats['p90_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms  {label} {rss}")
+    else:
+        print(f"{name:45s} {stats['images_per_sec']:9.1f} img/s  total {stats['seconds']:8.2f} s  {label} {rss}")
+
+def compare_to_baseline(results, baseline, tolerance=0.1):
+    """
+    Compare images/sec of every benchmark present in both runs.
+    Returns a list of (name, baseline img/s, current img/s) for those slower by more than tolerance.
+    """
+    regressions = []
+    for section in ("ops", "resize_decode", "entry_points"):
+        for name, stats in results.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if not old or "images_per_sec" not in old or "images_per_sec" not in stats:
+                continue
+            ratio = stats["images_per_sec"] / old["images_per_sec"]
+            status = "REGRESSION" if ratio < 1 - tolerance else "ok"
+            print(f"{name:45s} {old['images_per_sec']:9.1f} -> {stats['images_per_sec']:9.1f} img/s "
+                  f"({ratio:6.2f}x) {status}")
+            if ratio < 1 - tolerance:
+                regressions.append((name, old["images_per_sec"], stats["images_per_sec"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the augmentation ops and scripts on a synthetic dataset.")
+    parser.add_argument("--images", type=int, default=50, help="number of synthetic images")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=640)
+    parser.add_argument("--boxes", type=int, default=5, help="boxes per image")
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the images for the op timings")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="workers for PipelineFinal")
+    parser.add_argument("--only", nargs="*", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("--skip-ops", action="store_true")
+    parser.add_argument("--skip-entry-points", action="store_true")
+    parser.add_argument("--skip-resize-decode", action="store_true")
+    parser.add_argument("--resize-images", type=int, default=20, help="number of large images for the decode section")
+    parser.add_argument("--resize-width", type=int, default=1920, help="width of the decode section's images")
+    parser.add_argument("--resize-height", type=int, default=1080, help="height of the decode section's images")
+    parser.add_argument("--data-dir", help="keep the synthetic dataset here instead of a temporary folder")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--save-baseline", help="write the results as the baseline JSON")
+    parser.add_argument("--baseline", help="compare against this baseline JSON, exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed images/sec drop, 0.1 = 10%%")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="bench_data_")
+    try:
+        start = time.perf_counter()
+        generate_dataset(data_dir, args.images, (args.width, args.height), args.boxes)
+        print(f"Generated {args.images} {args.width}x{args.height} images with {args.boxes} boxes "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        results = {
+            "config": {"images": args.images, "size": [args.width, args.height], "boxes": args.boxes,
+                       "repeats": args.repeats, "workers": args.workers,
+                       "resize_images": args.resize_images, "resize_size": [args.resize_width, args.resize_height]},
+            "ops": {},
+            "resize_decode": {},
+            "entry_points": {},
+        }
+        if not args.skip_ops:
+            print("\nOps")
+            results["ops"] = benchmark_ops(data_dir, args.repeats, args.only)
+        if not args.skip_resize_decode:
+            # The reduced decode needs sources well above the 640x640 target, the main set is too small
+            print(f"\nResizeImg decode ({args.resize_images} {args.resize_width}x{args.resize_height} images)")
+            resize_dir = tempfile.mkdtemp(prefix="bench_resize_")
+            try:
+                generate_dataset(resize_dir, args.resize_images, (args.resize_width, args.resize_height), args.boxes)
+                results["resize_decode"] = benchmark_resize_decode(resize_dir, repeats=args.repeats)
+            finally:
+                shutil.rmtree(resize_dir, ignore_errors=True)
+        if not args.skip_entry_points:
+            print("\nEntry points")
+            results["entry_points"] = benchmark_entry_points(data_dir, args.workers, args.only)
+        results["process_peak_rss_mb"] = peak_rss_mb()
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+            print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        if baseline.get("config") != results["config"]:
+            print("Warning: baseline was recorded with a different configuration")
+        print("\nCompared to baseline")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import numpy as np
+
+# All matrices are 2x3 affine transforms in continuous pixel coordinates, where an image of
+# width w spans x in [0, w]. They map source points to destination points, the same
+# convention as cv2.warpAffine (without WARP_INVERSE_MAP).
+
+def translation_matrix(tx, ty):
+    return np.array([[1, 0, tx], [0, 1, ty]], dtype=np.float64)
+
+def scale_matrix(sx, sy):
+    return np.array([[sx, 0, 0], [0, sy, 0]], dtype=np.float64)
+
+def flip_matrix(width, height, horizontal=True):
+    """Mirror left-right (horizontal) or top-bottom, like Image.FLIP_LEFT_RIGHT / FLIP_TOP_BOTTOM."""
+    if horizontal:
+        return np.array([[-1, 0, width], [0, 1, 0]], dtype=np.float64)
+    return np.array([[1, 0, 0], [0, -1, height]], dtype=np.float64)
+
+def rotation_matrix(width, height, angle, scale=1.0):
+    """
+    Rotate counter-clockwise by angle degrees about the image centre.
+    Same geometry as PIL Image.rotate(angle) and cv2.getRotationMatrix2D((w / 2, h / 2), angle, scale).
+    """
+    radians = np.deg2rad(angle)
+    a = np.cos(radians) * scale
+    b = np.sin(radians) * scale
+    cx, cy = width / 2, height / 2
+    return np.array([[a, b, (1 - a) * cx - b * cy],
+                     [-b, a, b * cx + (1 - a) * cy]], dtype=np.float64)
+
+def compose(*matrices):
+    """Chain affine matrices, the first one is applied first."""
+    result = np.eye(3)
+    for matrix in matrices:
+        result = np.vstack([matrix, [0, 0, 1]]) @ result
+    return result[:2]
+
+def invert(matrix):
+    """Inverse of a 2x3 affine matrix (destination to source), e.g. for PIL's Image.transform."""
+    return np.linalg.inv(np.vstack([matrix, [0, 0, 1]]))[:2]
+
+def transform_boxes(boxes, matrix, src_size, dst_size=None, min_size=1.0):
+    """
+    Map YOLO boxes through an affine transform.
+
+    All four corners of every box are transformed at once, the axis-aligned box around them
+    is clipped to the destination image and boxes narrower or shorter than min_size pixels
+    are dropped.
+
+    Parameters:
+    - boxes: N x 4 array of normalized (x_center, y_center, width, height).
+    - matrix: The 2x3 affine matrix used to warp the pixels.
+    - src_size: (width, height) of the source image.
+    - dst_size: (width, height) of the destination image (default: src_size).
+    - min_size: Minimum box width and height in destination pixels.
+
+    Returns:
+    - boxes: M x 4 float32 array of normalized boxes that survived.
+    - keep: N boolean mask of the input boxes that were kept, to filter class ids with.
+    """
+    if dst_size is None:
+        dst_size = src_size
+    src_w, src_h = src_size
+    dst_w, dst_h = dst_size
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+    x1 = (boxes[:, 0] - boxes[:, 2] / 2) * src_w
+    x2 = (boxes[:, 0] + boxes[:, 2] / 2) * src_w
+    y1 = (boxes[:, 1] - boxes[:, 3] / 2) * src_h
+    y2 = (boxes[:, 1] + boxes[:, 3] / 2) * src_h
+
+    # N x 4 x 2 corners -> transformed with one matmul
+    corners = np.stack([np.stack([x1, y1], -1), np.stack([x2, y1], -1),
+                        np.stack([x2, y2], -1), np.stack([x1, y2], -1)], axis=1)
+    matrix = np.asarray(matrix, dtype=np.float64)
+    corners = corners @ matrix[:, :2].T + matrix[:, 2]
+
+    new_x1 = np.clip(corners[..., 0].min(axis=1), 0, dst_w)
+    new_x2 = np.clip(corners[..., 0].max(axis=1), 0, dst_w)
+    new_y1 = np.clip(corners[..., 1].min(axis=1), 0, dst_h)
+    new_y2 = np.clip(corners[..., 1].max(axis=1), 0, dst_h)
+
+    keep = ((new_x2 - new_x1) >= min_size) & ((new_y2 - new_y1) >= min_size)
+    result = np.stack([(new_x1 + new_x2) / 2 / dst_w, (new_y1 + new_y2) / 2 / dst_h,
+                       (new_x2 - new_x1) / dst_w, (new_y2 - new_y1) / dst_h], axis=1)
+    return result[keep].astype(np.float32), keep
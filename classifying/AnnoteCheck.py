@@ -1,5 +1,10 @@
 import os
+import sys
 from collections import defaultdict
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labelio import read_label_dir
 
 def count_objects_per_class(annotation_dir):
     """
@@ -13,24 +18,20 @@ def count_objects_per_class(annotation_dir):
     """
     class_counts = defaultdict(int)
 
-    for filename in os.listdir(annotation_dir):
-        if filename.endswith(".txt"):
-            file_path = os.path.join(annotation_dir, filename)
-            try:
-                with open(file_path, 'r') as file:
-                    for line in file:
-                        parts = line.strip().split()
-                        if len(parts) ==  5:
-                            class_id = int(parts[0])    
-                            class_counts[class_id] +=  1
-            except Exception as e:
-                print("Error for {file_path}:{e}")
+    errors = []
+    _, class_ids, _, _ = read_label_dir(annotation_dir, errors)
+    for file_path, line_num, line in errors:
+        print(f"Error for {file_path}, line {line_num}: {line}")
+
+    for class_id, count in zip(*np.unique(class_ids, return_counts=True)):
+        class_counts[int(class_id)] += int(count)
 
     return class_counts
 
-annotation_dir = r"c:\Users\USER\OneDrive\Desktop\train"
-class_counts = count_objects_per_class(annotation_dir)
+if __name__ == "__main__":
+    annotation_dir = r"c:\Users\USER\OneDrive\Desktop\train"
+    class_counts = count_objects_per_class(annotation_dir)
 
-print("Number of objects per class:")
-for class_id, count in class_counts.items():
-    print(f"Class {class_id}: {count} objects")
+    print("Number of objects per class:")
+    for class_id, count in class_counts.items():
+        print(f"Class {class_id}: {count} objects")
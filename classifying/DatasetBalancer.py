@@ -1,8 +1,14 @@
 import os
+import sys
 import shutil
 import json
 from collections import defaultdict
 import random
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labelio import read_label_rows
+from dataset_index import DatasetIndex
 
 class DatasetBalancer:
     """
@@ -10,7 +16,7 @@ class DatasetBalancer:
     It reads from an input folder and a secondary folder, copying or moving files as needed to reach the target.
     """
 
-    def __init__(self, input_folder, secondary_folder, output_folder, extra_folder, target_count=300):
+    def __init__(self, input_folder, secondary_folder, output_folder, extra_folder, target_count=300, index_cache=False):
         """
         Initialize the DatasetBalancer with input, secondary, output, and extra folders.
 
@@ -19,6 +25,7 @@ class DatasetBalancer:
         :param output_folder: Path to the output folder where balanced dataset will be created
         :param extra_folder: Path to the extra folder where excess annotations will be moved
         :param target_count: Target number of annotations per class (default: 300)
+        :param index_cache: Reuse the cached listing of unchanged source folders
         """
         self.input_folder = input_folder
         self.secondary_folder = secondary_folder
@@ -31,6 +38,8 @@ class DatasetBalancer:
             "class_files": defaultdict(list)
         }
         self.json_path = os.path.join(output_folder, "dataset_balance_state.json")
+        self.index_cache = index_cache
+        self._indexes = {}
 
     def balance_dataset(self):
         """
@@ -78,12 +87,13 @@ class DatasetBalancer:
         :param filepath: Path to the annotation file
         :param filename: Name of the annotation file
         """
-        with open(filepath, 'r') as file:
-            for line in file:
-                class_id = int(line.split()[0])
-                self.data["class_counts"][class_id] += 1
-                if filename not in self.data["class_files"][class_id]:
-                    self.data["class_files"][class_id].append(filename)
+        # Every annotation counts, polygon lines as well as boxes
+        class_ids, _ = read_label_rows(filepath)
+        for class_id, count in zip(*np.unique(class_ids, return_counts=True)):
+            class_id = int(class_id)
+            self.data["class_counts"][class_id] += int(count)
+            if filename not in self.data["class_files"][class_id]:
+                self.data["class_files"][class_id].append(filename)
 
     def _copy_folder_contents(self, src_folder, dst_folder):
         """
@@ -101,6 +111,7 @@ class DatasetBalancer:
             if os.path.isfile(s):
                 shutil.copy2(s, d)
                 self.data["processed_files"].add(item)
+        self._indexes.pop(dst_folder, None)
 
     def _add_annotations_from_secondary(self):
         """
@@ -118,15 +129,40 @@ class DatasetBalancer:
         :param filepath: Path to the annotation file
         :param filename: Name of the file
         """
-        with open(filepath, 'r') as file:
-            for line in file:
-                class_id = int(line.split()[0])
-                if self.data["class_counts"][class_id] < self.target_count and filename not in self.data["processed_files"]:
-                    self._copy_file_pair(self.secondary_folder, self.output_folder, filename)
-                    self.data["class_counts"][class_id] += 1
-                    if filename not in self.data["class_files"][class_id]:
-                        self.data["class_files"][class_id].append(filename)
-                    break  # Only copy once per file
+        class_ids, _ = read_label_rows(filepath)
+        for class_id in class_ids.tolist():
+            if self.data["class_counts"][class_id] < self.target_count and filename not in self.data["processed_files"]:
+                self._copy_file_pair(self.secondary_folder, self.output_folder, filename)
+                self.data["class_counts"][class_id] += 1
+                if filename not in self.data["class_files"][class_id]:
+                    self.data["class_files"][class_id].append(filename)
+                break  # Only copy once per file
+
+    def _get_index(self, folder):
+        """
+        Get the index of a folder, scanned once and reused until files are copied into it.
+
+        :param folder: Folder to index
+        :return: DatasetIndex of the folder
+        """
+        if folder not in self._indexes:
+            # Only source folders are worth caching, the output folders change on every run
+            cache = self.index_cache and folder in (self.input_folder, self.secondary_folder)
+            self._indexes[folder] = DatasetIndex(folder, cache=cache)
+        return self._indexes[folder]
+
+    def _pair_paths(self, folder, filename):
+        """
+        Paths of an annotation file and all of its images in a folder.
+
+        :param folder: Folder to look in
+        :param filename: Name of the annotation file
+        :return: List of existing file paths
+        """
+        index = self._get_index(folder)
+        base_name = os.path.splitext(filename)[0]
+        label_path = index.label_path(base_name)
+        return ([label_path] if label_path else []) + index.image_paths(base_name)
 
     def _copy_file_pair(self, src_folder, dst_folder, filename):
         """
@@ -136,12 +172,9 @@ class DatasetBalancer:
         :param dst_folder: Destination folder path
         :param filename: Name of the annotation file
         """
-        base_name = os.path.splitext(filename)[0]
-        for ext in ['.txt', '.jpg', '.png', '.jpeg']:
-            src_path = os.path.join(src_folder, base_name + ext)
-            if os.path.exists(src_path):
-                dst_path = os.path.join(dst_folder, base_name + ext)
-                shutil.copy2(src_path, dst_path)
+        for src_path in self._pair_paths(src_folder, filename):
+            shutil.copy2(src_path, os.path.join(dst_folder, os.path.basename(src_path)))
+        self._indexes.pop(dst_folder, None)
         self.data["processed_files"].add(filename)
 
     def _remove_excess_annotations(self):
@@ -170,12 +203,10 @@ class DatasetBalancer:
         :param dst_folder: Destination folder path
         :param filename: Name of the annotation file
         """
-        base_name = os.path.splitext(filename)[0]
-        for ext in ['.txt', '.jpg', '.png', '.jpeg']:
-            src_path = os.path.join(src_folder, base_name + ext)
-            if os.path.exists(src_path):
-                dst_path = os.path.join(dst_folder, base_name + ext)
-                shutil.move(src_path, dst_path)
+        for src_path in self._pair_paths(src_folder, filename):
+            shutil.move(src_path, os.path.join(dst_folder, os.path.basename(src_path)))
+        self._get_index(src_folder).discard(os.path.splitext(filename)[0])
+        self._indexes.pop(dst_folder, None)
 
     def _print_class_counts(self, message="Current class counts:"):
         """
@@ -1,14 +1,18 @@
 import os
-import glob
+import sys
 import shutil
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labelio import read_label_rows, write_labels, remap_class_ids
+from dataset_index import DatasetIndex
+
 class AnnotationCleaner:
     """
     A class to clean and reorganize annotation files for object detection datasets.
     It filters out unwanted classes and remaps class IDs.
     """
 
-    def __init__(self, input_dir, output_dir, keep_classes, new_class_names):
+    def __init__(self, input_dir, output_dir, keep_classes, new_class_names, index_cache=False):
         """
         Initialize the AnnotationCleaner with input and output directories,
         classes to keep, and new class names.
@@ -17,11 +21,14 @@ class AnnotationCleaner:
         :param output_dir: Directory to save cleaned annotation files
         :param keep_classes: Dictionary mapping old class IDs to new class IDs
         :param new_class_names: List of new class names for the cleaned dataset
+        :param index_cache: Reuse the cached listing of input_dir while it is unchanged
         """
         self.input_dir = input_dir
         self.output_dir = output_dir
         self.keep_classes = keep_classes
         self.new_class_names = new_class_names
+        self.index_cache = index_cache
+        self.index = None
 
     def clean_annotations(self):
         """
@@ -29,7 +36,7 @@ class AnnotationCleaner:
         It creates the output directory, processes each file, and creates a classes file.
         """
         os.makedirs(self.output_dir, exist_ok=True)
-        annotation_files = glob.glob(os.path.join(self.input_dir, '*.txt'))
+        annotation_files = [file_path for _, file_path in self._get_index().labels()]
         
         print(f"Found {len(annotation_files)} annotation files to process.")
         
@@ -50,52 +57,46 @@ class AnnotationCleaner:
         :param file_path: Path to the annotation file to process
         """
         print(f"Processing file: {file_path}")
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-        
-        updated_lines = []
-        for line in lines:
-            parts = line.strip().split()
-            if parts:
-                try:
-                    old_class = int(parts[0].rstrip(':'))
-                    if old_class in self.keep_classes:
-                        new_class = self.keep_classes[old_class]
-                        # Preserve the format (with or without colon)
-                        if ':' in parts[0]:
-                            updated_line = f"{new_class}: {' '.join(parts[1:])}\n"
-                        else:
-                            updated_line = f"{new_class} {' '.join(parts[1:])}\n"
-                        updated_lines.append(updated_line)
-                    else:
-                        print(f"  Removing annotation with class {old_class}")
-                except ValueError:
-                    print(f"  Skipping invalid line: {line.strip()}")
-        
-        if updated_lines:
+        errors = []
+        # Polygon lines are kept, with only their class remapped
+        class_ids, boxes = read_label_rows(file_path, errors)
+        for _, _, line in errors:
+            print(f"  Skipping invalid line: {line}")
+
+        new_class_ids, keep = remap_class_ids(class_ids, self.keep_classes)
+        for old_class in class_ids[~keep].tolist():
+            print(f"  Removing annotation with class {old_class}")
+
+        if keep.any():
             output_file = os.path.join(self.output_dir, os.path.basename(file_path))
-            with open(output_file, 'w') as file:
-                file.writelines(updated_lines)
-            print(f"  Wrote {len(updated_lines)} annotations to {output_file}")
+            write_labels(output_file, new_class_ids[keep], boxes[keep])
+            print(f"  Wrote {int(keep.sum())} annotations to {output_file}")
             self._copy_related_image(file_path)
         else:
             print(f"  No annotations left after cleaning, skipping output file")
 
+    def _get_index(self):
+        """
+        Index of the input directory, scanned once and shared by all files.
+        """
+        if self.index is None:
+            self.index = DatasetIndex(self.input_dir, cache=self.index_cache)
+        return self.index
+
     def _copy_related_image(self, annotation_file_path):
         """
         Copy the image file related to the annotation file if it exists.
-        It checks for common image extensions.
+        It looks the image up in the directory index.
 
         :param annotation_file_path: Path to the annotation file
         """
         base_name = os.path.splitext(os.path.basename(annotation_file_path))[0]
-        for ext in ['.jpg', '.jpeg', '.png', '.bmp']:
-            image_file = os.path.join(self.input_dir, base_name + ext)
-            if os.path.exists(image_file):
-                dest_file = os.path.join(self.output_dir, os.path.basename(image_file))
-                shutil.copy2(image_file, dest_file)
-                print(f"  Copied related image: {dest_file}")
-                return
+        image_file = self._get_index().image_path(base_name)
+        if image_file:
+            dest_file = os.path.join(self.output_dir, os.path.basename(image_file))
+            shutil.copy2(image_file, dest_file)
+            print(f"  Copied related image: {dest_file}")
+            return
         print(f"  No related image found for {annotation_file_path}")
 
     def _create_classes_file(self):
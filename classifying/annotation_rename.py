@@ -1,7 +1,12 @@
 import os
+import sys
 import glob
 import shutil
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labelio import parse_labels, format_labels, remap_class_ids, remap_label_lines
+from journal import atomic_write
+
 class AnnotationUpdater:
     """
     A class to update annotation files for object detection datasets.
@@ -64,35 +69,30 @@ class AnnotationUpdater:
         """
         try:
             with open(file_path, 'r') as file:
-                lines = file.readlines()
+                text = file.read()
         except IOError as e:
             self._log_error(f"Error reading file {file_path}: {str(e)}")
             return
 
-        updated_lines = []
-        for line_num, line in enumerate(lines, 1):
-            parts = line.strip().split()
-            if not parts:
-                continue
-
-            try:
-                old_class = parts[0].rstrip(':')  # Remove trailing colon if present
-                old_class = int(old_class)
-                if old_class in self.class_mapping:
-                    new_class = self.class_mapping[old_class]
-                    updated_line = f"{new_class} {' '.join(parts[1:])}\n"
-                    updated_lines.append(updated_line)
-                else:
-                    self._log_error(f"Unexpected class {old_class} in file {file_path}, line {line_num}")
-                    updated_lines.append(line)
-            except ValueError:
-                self._log_error(f"Invalid class format '{parts[0]}' in file {file_path}, line {line_num}")
-                updated_lines.append(line)
+        errors = []
+        class_ids, boxes = parse_labels(text, file_path, errors)
+        if not errors:
+            # Unexpected classes keep their number and are logged
+            new_class_ids, mapped = remap_class_ids(class_ids, self.class_mapping)
+            unexpected = sorted(set(class_ids[~mapped].tolist()))
+            text = format_labels(new_class_ids, boxes)
+        else:
+            # Not every line is a box (e.g. polygons), remap line by line, unparseable lines are kept unchanged
+            errors = []
+            text, unexpected = remap_label_lines(text, self.class_mapping, file_path, errors)
+            for _, line_num, line in errors:
+                self._log_error(f"Invalid class format '{line.split()[0]}' in file {file_path}, line {line_num}")
+        for old_class in unexpected:
+            self._log_error(f"Unexpected class {old_class} in file {file_path}")
 
         output_file = os.path.join(self.output_dir, os.path.basename(file_path))
         try:
-            with open(output_file, 'w') as file:
-                file.writelines(updated_lines)
+            atomic_write(output_file, text)
         except IOError as e:
             self._log_error(f"Error writing to file {output_file}: {str(e)}")
 
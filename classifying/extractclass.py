@@ -1,5 +1,10 @@
 import os
+import sys
 import glob
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labelio import read_label_rows, write_labels, remap_class_ids
 
 class AnnotationUpdater:
     def __init__(self, input_dir, output_dir, extraction_dir, class_mapping, class_names, target_classes):
@@ -32,47 +37,34 @@ class AnnotationUpdater:
         self._write_error_log()
 
     def _process_file(self, file_path):
+        errors = []
         try:
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
+            # Polygon lines are kept, with only their class remapped
+            class_ids, boxes = read_label_rows(file_path, errors)
         except IOError as e:
             self._log_error(f"Error reading file {file_path}: {str(e)}")
             return
 
-        updated_lines = []
-        extracted_lines = []
-        for line_num, line in enumerate(lines, 1):
-            parts = line.strip().split()
-            if not parts:
-                continue
+        for _, line_num, _ in errors:
+            self._log_error(f"Invalid class value in file {file_path}, line {line_num}")
 
-            try:
-                old_class = parts[0].rstrip(':')  # Remove trailing colon if present
-                old_class = int(old_class)
-                if old_class in self.class_mapping:
-                    new_class = self.class_mapping[old_class]
-                    updated_line = f"{new_class} {' '.join(parts[1:])}\n"
-                    updated_lines.append(updated_line)
-                    if new_class in self.target_classes:
-                        extracted_lines.append(updated_line)
-                else:
-                    self._log_error(f"Unexpected class {old_class} in file {file_path}, line {line_num}")
-            except ValueError:
-                self._log_error(f"Invalid class value in file {file_path}, line {line_num}")
-
-        if updated_lines:
+        new_class_ids, mapped = remap_class_ids(class_ids, self.class_mapping)
+        for old_class in sorted(set(class_ids[~mapped].tolist())):
+            self._log_error(f"Unexpected class {old_class} in file {file_path}")
+        new_class_ids, boxes = new_class_ids[mapped], boxes[mapped]
+        extracted = np.isin(new_class_ids, list(self.target_classes))
+
+        if len(new_class_ids):
             output_file = os.path.join(self.output_dir, os.path.basename(file_path))
             try:
-                with open(output_file, 'w') as file:
-                    file.writelines(updated_lines)
+                write_labels(output_file, new_class_ids, boxes)
             except IOError as e:
                 self._log_error(f"Error writing to file {output_file}: {str(e)}")
 
-        if extracted_lines:
+        if extracted.any():
             extraction_file = os.path.join(self.extraction_dir, os.path.basename(file_path))
             try:
-                with open(extraction_file, 'w') as file:
-                    file.writelines(extracted_lines)
+                write_labels(extraction_file, new_class_ids[extracted], boxes[extracted])
             except IOError as e:
                 self._log_error(f"Error writing to file {extraction_file}: {str(e)}")
 
@@ -119,8 +111,11 @@ if __name__ == "__main__":
         'welding mask'
     ]
 import os
+import sys
 import glob
 import shutil
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from labelio import read_label_rows, write_labels, remap_class_ids
 
 class AnnotationUpdater:
     def __init__(self, input_dir, output_dir, class_mapping, class_names, target_classes):
@@ -151,43 +146,29 @@ class AnnotationUpdater:
         self._write_error_log()
 
     def _process_file(self, file_path):
+        errors = []
         try:
-            with open(file_path, 'r') as file:
-                lines = file.readlines()
+            # Polygon lines are kept, with only their class remapped
+            class_ids, boxes = read_label_rows(file_path, errors)
         except IOError as e:
             self._log_error(f"Error reading file {file_path}: {str(e)}")
             return
 
-        contains_target_class = False
-        updated_lines = []
-        for line_num, line in enumerate(lines, 1):
-            parts = line.strip().split()
-            if not parts:
-                continue
+        for _, line_num, _ in errors:
+            self._log_error(f"Invalid class value in file {file_path}, line {line_num}")
 
-            try:
-                old_class = parts[0].rstrip(':')  # Remove trailing colon if present
-                old_class = int(old_class)
-                if old_class in self.class_mapping:
-                    new_class = self.class_mapping[old_class]
-                    updated_line = f"{new_class} {' '.join(parts[1:])}\n"
-                    updated_lines.append(updated_line)
-                    if new_class in self.target_classes:
-                        contains_target_class = True
-                else:
-                    self._log_error(f"Unexpected class {old_class} in file {file_path}, line {line_num}")
-            except ValueError:
-                self._log_error(f"Invalid class value in file {file_path}, line {line_num}")
-
-        if contains_target_class:
-            self._copy_files_to_output(file_path, updated_lines)
-
-    def _copy_files_to_output(self, txt_file_path, updated_lines):
+        new_class_ids, mapped = remap_class_ids(class_ids, self.class_mapping)
+        for old_class in sorted(set(class_ids[~mapped].tolist())):
+            self._log_error(f"Unexpected class {old_class} in file {file_path}")
+        new_class_ids, boxes = new_class_ids[mapped], boxes[mapped]
+        if np.isin(new_class_ids, list(self.target_classes)).any():
+            self._copy_files_to_output(file_path, new_class_ids, boxes)
+
+    def _copy_files_to_output(self, txt_file_path, class_ids, boxes):
         # Copy and update the .txt file
         output_txt_file = os.path.join(self.output_dir, os.path.basename(txt_file_path))
         try:
-            with open(output_txt_file, 'w') as file:
-                file.writelines(updated_lines)
+            write_labels(output_txt_file, class_ids, boxes)
         except IOError as e:
             self._log_error(f"Error writing to file {output_txt_file}: {str(e)}")
 
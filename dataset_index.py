@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import tempfile
+
+# Image extensions in order of preference, when a stem has several images the first one wins
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+LABEL_EXTENSION = '.txt'
+
+def default_cache_dir():
+    return os.path.join(tempfile.gettempdir(), "dataset_index")
+
+class DatasetIndex:
+    """
+    Every image and label file of one directory, grouped by stem, from a single os.scandir pass.
+
+    Looking up a pair costs a dict access instead of one os.path.exists per candidate extension,
+    which adds up to thousands of stat calls on a network drive. Each entry is a dict with:
+    - images: Paths of the stem's images, most preferred extension first.
+    - label: Path of the stem's .txt file, or None.
+    - sizes / mtimes: Size in bytes and modification time of each of those files, by path.
+
+    With cache=True the scan is stored as JSON under cache_dir and reused as long as the
+    directory's mtime is unchanged. Adding, removing or renaming a file updates that mtime,
+    rewriting a file in place does not, so the cached sizes and mtimes can be stale then.
+    """
+
+    def __init__(self, directory, cache=False, cache_dir=None):
+        """
+        :param directory: Folder to index (not recursive)
+        :param cache: Load and store the scan in an on-disk cache
+        :param cache_dir: Folder for the cache files (default: <temp dir>/dataset_index)
+        """
+        self.directory = directory
+        self.entries = None
+        directory_mtime = os.stat(directory).st_mtime_ns
+
+        cache_path = None
+        if cache:
+            key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()
+            cache_path = os.path.join(cache_dir or default_cache_dir(), key + ".json")
+            self.entries = self._load_cache(cache_path, directory_mtime)
+
+        if self.entries is None:
+            self.entries = self._scan()
+            if cache_path:
+                self._save_cache(cache_path, directory_mtime)
+
+    def _scan(self):
+        entries = {}
+        with os.scandir(self.directory) as it:
+            for dir_entry in it:
+                stem, ext = os.path.splitext(dir_entry.name)
+                ext = ext.lower()
+                if ext != LABEL_EXTENSION and ext not in IMAGE_EXTENSIONS:
+                    continue
+                if not dir_entry.is_file():
+                    continue
+                stat = dir_entry.stat()
+                entry = entries.setdefault(stem, {"images": [], "label": None, "sizes": {}, "mtimes": {}})
+                if ext == LABEL_EXTENSION:
+                    entry["label"] = dir_entry.path
+                else:
+                    entry["images"].append(dir_entry.path)
+                entry["sizes"][dir_entry.path] = stat.st_size
+                entry["mtimes"][dir_entry.path] = stat.st_mtime
+
+        for entry in entries.values():
+            entry["images"].sort(key=lambda path: IMAGE_EXTENSIONS.index(os.path.splitext(path)[1].lower()))
+        return entries
+
+    def _load_cache(self, cache_path, directory_mtime):
+        try:
+            with open(cache_path, 'r') as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if cached.get("directory_mtime") != directory_mtime:
+            return None
+        return cached["entries"]
+
+    def _save_cache(self, cache_path, directory_mtime):
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, 'w') as file:
+                json.dump({"directory": os.path.abspath(self.directory),
+                           "directory_mtime": directory_mtime,
+                           "entries": self.entries}, file)
+        except OSError as e:
+            print(f"Warning: Could not write dataset index cache {cache_path}: {e}")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, stem):
+        return stem in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def get(self, stem):
+        """The entry dict of a stem, or None."""
+        return self.entries.get(stem)
+
+    def image_path(self, stem):
+        """Path of the stem's preferred image, or None."""
+        entry = self.entries.get(stem)
+        return entry["images"][0] if entry and entry["images"] else None
+
+    def image_paths(self, stem):
+        """Paths of all of the stem's images."""
+        entry = self.entries.get(stem)
+        return list(entry["images"]) if entry else []
+
+    def label_path(self, stem):
+        """Path of the stem's label file, or None."""
+        entry = self.entries.get(stem)
+        return entry["label"] if entry else None
+
+    def pair(self, stem):
+        """(image path, label path) of a stem, either may be None."""
+        return self.image_path(stem), self.label_path(stem)
+
+    def labels(self):
+        """(stem, label path) of every stem that has a label file."""
+        return [(stem, entry["label"]) for stem, entry in self.entries.items() if entry["label"]]
+
+    def images(self):
+        """(stem, preferred image path) of every stem that has an image."""
+        return [(stem, entry["images"][0]) for stem, entry in self.entries.items() if entry["images"]]
+
+    def discard(self, stem):
+        """Forget a stem, e.g. after moving its files out of the directory."""
+        self.entries.pop(stem, None)
@@ -0,0 +1,146 @@
+import glob
+import json
+import os
+import threading
+import time
+import cv2
+import numpy as np
+from PIL import Image
+
+def _decode_bgr(path):
+    return cv2.imread(path, cv2.IMREAD_COLOR)
+
+def _decode_rgb(path):
+    with Image.open(path) as img:
+        return np.asarray(img.convert('RGB'))
+
+# Pixel layouts the cache can hold, cv2 scripts use "bgr", PIL scripts "rgb"
+DECODERS = {
+    "bgr": _decode_bgr,
+    "rgb": _decode_rgb,
+}
+
+class DecodeCache:
+    """
+    Opt-in cache of decoded uint8 pixels in memory-mapped raw files.
+
+    The first run decodes every image as usual and appends its pixels to a segment file. Later
+    runs find the image in the index and get a read-only array backed by the memory map, the
+    pixels come straight from the page cache with no decode and no copy.
+
+    Layout of cache_dir: every process appends to its own segment-<pid>-<time>.raw and writes one
+    JSON line per image to the matching .jsonl index (path, size, mtime, mode, offset, shape),
+    so worker processes never share a file. An entry only matches while the source file keeps
+    the same size and mtime, an edited image is decoded and stored again.
+    Delete the folder to clear the cache.
+    """
+
+    def __init__(self, cache_dir, max_segment_size=4 << 30):
+        """
+        :param cache_dir: Folder for the segment and index files
+        :param max_segment_size: Start a new segment file once the current one reaches this many bytes
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_segment_size = max_segment_size
+        self._lock = threading.Lock()
+        self._maps = {}
+        self._segment = None
+        self._raw = None
+        self._index_file = None
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+        for index_path in glob.glob(os.path.join(glob.escape(cache_dir), "segment-*.jsonl")):
+            self._load_index(index_path)
+
+    def _load_index(self, index_path):
+        segment = os.path.splitext(os.path.basename(index_path))[0] + ".raw"
+        with open(index_path, 'r') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn last line of a run that was killed
+                entry["segment"] = segment
+                self.entries[(entry["path"], entry["size"], entry["mtime"], entry["mode"])] = entry
+
+    def _open_segment(self):
+        if self._raw is not None:
+            self._raw.close()
+            self._index_file.close()
+        name = f"segment-{os.getpid()}-{time.time_ns()}"
+        self._segment = name + ".raw"
+        self._raw = open(os.path.join(self.cache_dir, self._segment), 'ab')
+        self._index_file = open(os.path.join(self.cache_dir, name + ".jsonl"), 'a')
+
+    def _view(self, entry):
+        segment = entry["segment"]
+        nbytes = int(np.prod(entry["shape"]))
+        mapped = self._maps.get(segment)
+        if mapped is None or entry["offset"] + nbytes > len(mapped):
+            # First use of the segment, or it grew since it was mapped
+            mapped = np.memmap(os.path.join(self.cache_dir, segment), dtype=np.uint8, mode='r')
+            self._maps[segment] = mapped
+        return mapped[entry["offset"]:entry["offset"] + nbytes].reshape(entry["shape"])
+
+    def _store(self, key, pixels):
+        if self._raw is None or self._raw.tell() >= self.max_segment_size:
+            self._open_segment()
+        offset = self._raw.tell()
+        self._raw.write(np.ascontiguousarray(pixels).tobytes())
+        self._raw.flush()
+        # The pixels are on disk before the index line that points at them
+        path, size, mtime, mode = key
+        entry = {"path": path, "size": size, "mtime": mtime, "mode": mode,
+                 "offset": offset, "shape": list(pixels.shape)}
+        self._index_file.write(json.dumps(entry) + "\n")
+        self._index_file.flush()
+        entry["segment"] = self._segment
+        self.entries[key] = entry
+
+    def load(self, path, mode="bgr"):
+        """
+        Return the decoded pixels of an image as a uint8 array, or None if it cannot be read.
+        Cached pixels are a read-only view of the memory map, ops must not modify them in place.
+
+        :param path: Image path
+        :param mode: Pixel layout, a key of DECODERS
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, mode)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                return self._view(entry)
+
+        pixels = DECODERS[mode](path)
+        if pixels is None:
+            return None
+        with self._lock:
+            self.misses += 1
+            if key not in self.entries:
+                self._store(key, pixels)
+        return pixels
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0.0
+        print(f"Decode cache: {self.hits} hits, {self.misses} decoded ({rate:.0f}% hit rate), "
+              f"{len(self.entries)} images in {self.cache_dir}")
+
+    def close(self):
+        with self._lock:
+            if self._raw is not None:
+                self._raw.close()
+                self._index_file.close()
+                self._raw = None
+            self._maps = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
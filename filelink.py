@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import defaultdict
+from journal import atomic_copy
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# How an unchanged file gets into the output folder:
+# - hardlink: a second name for the same data, no bytes written. Opening the file for writing
+#             truncates the original too, so a tool that rewrites an output must write a temporary
+#             file and rename it over the link (labelio.write_labels and journal.atomic_write do).
+#             Anything else that rewrites files in place must not run on a hardlinked output.
+# - reflink:  copy-on-write clone (Btrfs, XFS), no bytes written until one side is modified.
+# - symlink:  a pointer to the original path, breaks if the input folder is moved.
+# - copy:     a full byte copy, the old behaviour, written to a temporary name and renamed into place.
+# Whatever the strategy, a file that cannot be linked falls back to a copy.
+LINK_STRATEGIES = ("hardlink", "reflink", "symlink", "copy")
+
+FICLONE = 0x40049409  # Linux ioctl, _IOW(0x94, 9, int)
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflink is not supported on this platform")
+    with open(src, 'rb') as source, open(dst, 'wb') as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except OSError:
+            target.close()
+            os.remove(dst)
+            raise
+
+def _link(src, dst, strategy):
+    if strategy == "hardlink":
+        os.link(src, dst)
+    elif strategy == "reflink":
+        _reflink(src, dst)
+    elif strategy == "symlink":
+        os.symlink(os.path.abspath(src), dst)
+    else:
+        atomic_copy(src, dst)
+
+class LinkStats:
+    """Counts how files were placed and how many bytes did not have to be written. Safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.fallbacks = 0
+        self.bytes_saved = 0
+        self.bytes_copied = 0
+
+    def record(self, requested, used, size):
+        with self._lock:
+            self.counts[used] += 1
+            if used != requested:
+                self.fallbacks += 1
+            if used == "copy":
+                self.bytes_copied += size
+            else:
+                self.bytes_saved += size
+
+    def report(self):
+        counts = ", ".join(f"{count} {strategy}" for strategy, count in sorted(self.counts.items()))
+        print(f"Placed {sum(self.counts.values())} unchanged files ({counts or 'none'}): "
+              f"{self.bytes_saved / 1e6:.1f} MB saved, {self.bytes_copied / 1e6:.1f} MB copied")
+        if self.fallbacks:
+            print(f"{self.fallbacks} files could not be linked and were copied instead")
+
+def link_file(src, dst, strategy="copy", stats=None):
+    """
+    Place src at dst using the given strategy, falling back to a copy if linking fails.
+
+    Parameters:
+    - src: Path of the original file.
+    - dst: Destination file path, replaced if it exists.
+    - strategy: One of LINK_STRATEGIES.
+    - stats: Optional LinkStats to record the result in.
+
+    Returns:
+    - The strategy actually used.
+    """
+    if strategy not in LINK_STRATEGIES:
+        raise ValueError(f"Unknown link strategy '{strategy}', expected one of {LINK_STRATEGIES}")
+
+    if os.path.lexists(dst):
+        if os.path.exists(dst) and os.path.samefile(src, dst):
+            used = strategy  # Already linked by an earlier run
+            if stats is not None:
+                stats.record(strategy, used, os.path.getsize(src))
+            return used
+        os.remove(dst)
+
+    used = strategy
+    try:
+        _link(src, dst, strategy)
+    except OSError:
+        # Different drive, filesystem without reflink, no symlink privilege on Windows...
+        used = "copy"
+        atomic_copy(src, dst)
+
+    if stats is not None:
+        stats.record(strategy, used, os.path.getsize(src))
+    return used
+
+def link_all_files(input_dir, output_dir, strategy="copy", stats=None, journal=None):
+    """
+    Place every file of input_dir into output_dir with link_file.
+    With a journal.Journal, files it lists as link:<name> are skipped and every placed file is recorded.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    for filename in os.listdir(input_dir):
+        if journal is not None and f"link:{filename}" in journal:
+            continue
+        file_path = os.path.join(input_dir, filename)
+        if os.path.isfile(file_path):
+            link_file(file_path, os.path.join(output_dir, filename), strategy, stats)
+            if journal is not None:
+                journal.mark_done(f"link:{filename}")
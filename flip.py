@@ -1,28 +1,43 @@
 import os
 from PIL import Image
+from boxes import flip_matrix, transform_boxes
+from labelio import read_labels, write_labels, format_labels
+from stages import run_stages
+from shards import encode_pil
 
-# Define the source and output directories
-source_dir = r'c:\Users\jack\Desktop\aspect-640'
-output_dir = r'c:\Users\Jack\Desktop\aspect-flip'
-
-# Ensure the output directory exists
-os.makedirs(output_dir, exist_ok=True)
+def read_sample(image_path, label_path):
+    """Decode an image and read its label file. Returns (image, class_ids, boxes)."""
+    # Load the image, Image.open alone only reads the header
+    img = Image.open(image_path)
+    img.load()
 
-def flip_coordinates(x_center, y_center, width, height):
-    """Flip the x_center of the bounding box coordinates."""
-    # Flip the x_center
-    flipped_x_center = 1 - x_center
-    # The width and height remain the same
-    return flipped_x_center, y_center, width, height
+    # Read the label file
+    errors = []
+    class_ids, coordinates = read_labels(label_path, errors)
+    for _, _, line in errors:
+        print(f"Warning: Skipping line '{line}' due to non-numerical values.")
+    return img, class_ids, coordinates
 
-def process_image_and_label(image_path, label_path, output_dir):
-    """Flip an image and its corresponding label file."""
-    # Load the image
-    img = Image.open(image_path)
+def flip_sample(img, class_ids, coordinates):
+    """Flip an image and its boxes. Returns (flipped image, class_ids, boxes)."""
     # Flip the image
     flipped_img = img.transpose(Image.FLIP_LEFT_RIGHT)
+
+    # Flip all boxes with the same matrix that describes the pixel flip
+    flipped, keep = transform_boxes(coordinates, flip_matrix(*img.size), img.size)
+    return flipped_img, class_ids[keep], flipped
+
+def save_sample(image_path, label_path, output_dir, sample, sink=None):
+    """Save a flipped sample with the _flip suffix, to output_dir or a shards sink."""
+    flipped_img, class_ids, flipped = sample
+
     # Construct the output path for the flipped image
     base_name, ext = os.path.splitext(os.path.basename(image_path))
+    if sink is not None:
+        sink.write_sample(f"{base_name}_flip", {ext[1:]: encode_pil(flipped_img, ext),
+                                                "txt": format_labels(class_ids, flipped).encode('utf-8')})
+        return
+
     output_image_name = f"{base_name}_flip{ext}"
     output_image_path = os.path.join(output_dir, output_image_name)
     # Save the flipped image
@@ -31,32 +46,45 @@ def process_image_and_label(image_path, label_path, output_dir):
     # Construct the output path for the flipped label file
     output_label_name = f"{os.path.splitext(os.path.basename(label_path))[0]}_flip.txt"
     output_label_path = os.path.join(output_dir, output_label_name)
+    write_labels(output_label_path, class_ids, flipped)
+
+def process_image_and_label(image_path, label_path, output_dir):
+    """Flip an image and its corresponding label file."""
+    save_sample(image_path, label_path, output_dir, flip_sample(*read_sample(image_path, label_path)))
+
+def process_directory(source_dir, output_dir, readers=2, writers=2, queue_size=8, sink=None):
+    """
+    Flip every labelled image in source_dir into output_dir, or into sink if given.
+    Decoding and encoding run in reader and writer threads, see stages.run_stages.
+    """
+    # Ensure the output directory exists
+    if sink is None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    pairs = []
+    # Iterate over all files in the source directory
+    for filename in os.listdir(source_dir):
+        # Check if the file is an image (e.g., .jpg, .png)
+        if filename.endswith(('.jpg', '.png')):
+            # Construct the full path to the image and its corresponding label file
+            image_path = os.path.join(source_dir, filename)
+            label_path = os.path.join(source_dir, os.path.splitext(filename)[0] + '.txt')
+
+            # Check if the label file exists
+            if os.path.exists(label_path):
+                pairs.append((image_path, label_path))
+
+    run_stages(pairs,
+               lambda pair: read_sample(*pair),
+               lambda pair, sample: flip_sample(*sample),
+               lambda pair, sample: save_sample(pair[0], pair[1], output_dir, sample, sink),
+               readers, writers, queue_size).report()
+
+if __name__ == "__main__":
+    # Define the source and output directories
+    source_dir = r'c:\Users\jack\Desktop\aspect-640'
+    output_dir = r'c:\Users\Jack\Desktop\aspect-flip'
+
+    process_directory(source_dir, output_dir)
 
-    # Flip the coordinates in the label file
-    with open(label_path, 'r') as infile, open(output_label_path, 'w') as outfile:
-        for line in infile:
-            components = line.strip().split(' ')
-            try:
-                class_index = components[0]
-                x_center = float(components[1])
-                y_center = float(components[2])
-                width = float(components[3])
-                height = float(components[4])
-                flipped_x_center, flipped_y_center, flipped_width, flipped_height = flip_coordinates(x_center, y_center, width, height)
-                outfile.write(f"{class_index} {flipped_x_center} {flipped_y_center} {flipped_width} {flipped_height}\n")
-            except ValueError:
-                print(f"Warning: Skipping line '{line.strip()}' due to non-numerical values.")
-
-# Iterate over all files in the source directory
-for filename in os.listdir(source_dir):
-    # Check if the file is an image (e.g., .jpg, .png)
-    if filename.endswith(('.jpg', '.png')):
-        # Construct the full path to the image and its corresponding label file
-        image_path = os.path.join(source_dir, filename)
-        label_path = os.path.join(source_dir, os.path.splitext(filename)[0] + '.txt')
-
-        # Check if the label file exists
-        if os.path.exists(label_path):
-            process_image_and_label(image_path, label_path, output_dir)
-
-print("Flipped images and labels have been saved in the output directory.")
\ No newline at end of file
+    print("Flipped images and labels have been saved in the output directory.")
@@ -0,0 +1,135 @@
+import os
+import cv2
+import numpy as np
+from boxes import compose, scale_matrix, translation_matrix, flip_matrix, rotation_matrix, transform_boxes
+from ResizeImg import letterbox_geometry
+from labelio import read_labels, write_labels
+
+class GeometricPipeline:
+    """
+    Letterbox, pad, flip and rotate in a single resample.
+
+    Running ResizeImg -> pad.py -> flip.py -> rotate.py decodes, resamples and re-encodes every
+    image four times. Here each step is a 2x3 matrix, the steps are composed into one matrix per
+    output variant and the image goes through one cv2.warpAffine. The labels are transformed
+    with the same matrix. Everything outside the source image is filled with border_color.
+    """
+
+    def __init__(self, letterbox_size=(640, 640), pad_size=None, variants=((False, 0),),
+                 interpolation=cv2.INTER_LINEAR, border_color=(0, 0, 0), antialias=True, quality=95):
+        """
+        :param letterbox_size: (width, height) to fit the image into keeping its aspect ratio, or None to keep its size
+        :param pad_size: (width, height) canvas to centre the letterboxed image on, or None for no padding
+        :param variants: Sequence of (flip, angle) pairs, one output image per pair. Names get
+                         '_padded', '_flip' and '_rotate_<angle>' appended like the standalone scripts
+        :param interpolation: OpenCV interpolation flag for the warp
+        :param border_color: BGR fill colour for the letterbox bars, padding and rotated corners
+        :param antialias: Gaussian pre-filter when shrinking so the single warp does not alias
+        :param quality: JPEG quality of the written images
+        """
+        self.letterbox_size = letterbox_size
+        self.pad_size = pad_size
+        self.variants = list(variants)
+        self.interpolation = interpolation
+        self.border_color = border_color
+        self.antialias = antialias
+        self.quality = quality
+
+    def base_matrix(self, width, height):
+        """Letterbox and pad matrix for a width x height source. Returns (matrix, canvas size, scale)."""
+        matrix = np.array([[1, 0, 0], [0, 1, 0]], dtype=np.float64)
+        canvas = (width, height)
+        scale = 1.0
+
+        if self.letterbox_size is not None:
+            paste_x, paste_y, new_width, new_height = letterbox_geometry((width, height), self.letterbox_size)
+            matrix = compose(scale_matrix(new_width / width, new_height / height),
+                             translation_matrix(paste_x, paste_y))
+            canvas = tuple(self.letterbox_size)
+            scale = min(new_width / width, new_height / height)
+
+        if self.pad_size is not None:
+            # Same offsets as pad.py
+            pad_x = (self.pad_size[0] - canvas[0]) // 2
+            pad_y = (self.pad_size[1] - canvas[1]) // 2
+            matrix = compose(matrix, translation_matrix(pad_x, pad_y))
+            canvas = tuple(self.pad_size)
+
+        return matrix, canvas, scale
+
+    def variant_matrix(self, base, canvas, flip, angle):
+        matrix = base
+        if flip:
+            matrix = compose(matrix, flip_matrix(*canvas))
+        if angle:
+            matrix = compose(matrix, rotation_matrix(canvas[0], canvas[1], angle))
+        return matrix
+
+    def variant_suffix(self, flip, angle):
+        suffix = '_padded' if self.pad_size is not None else ''
+        if flip:
+            suffix += '_flip'
+        if angle:
+            suffix += f'_rotate_{angle}'
+        return suffix
+
+    def warp(self, image, matrix, canvas):
+        # The matrices work on continuous coordinates (pixel i spans [i, i + 1]), warpAffine
+        # samples pixel centres, so shift by half a pixel on both sides
+        pixel_matrix = compose(translation_matrix(0.5, 0.5), matrix, translation_matrix(-0.5, -0.5))
+        return cv2.warpAffine(image, pixel_matrix, canvas, flags=self.interpolation,
+                              borderMode=cv2.BORDER_CONSTANT, borderValue=self.border_color)
+
+    def process(self, image_path, output_dir):
+        """Write every variant of one image and its label file to output_dir."""
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Failed to read image: {image_path}")
+            return
+        height, width = image.shape[:2]
+        base, canvas, scale = self.base_matrix(width, height)
+
+        if self.antialias and scale < 1:
+            # Pre-filter once for all variants, a warp alone would alias when shrinking
+            image = cv2.GaussianBlur(image, (0, 0), (1 / scale - 1) / 2)
+
+        label_path = os.path.splitext(image_path)[0] + '.txt'
+        errors = []
+        class_ids, coordinates = read_labels(label_path, errors)
+        for _, _, line in errors:
+            print(f"Warning: Skipping line '{line}' due to non-numerical values.")
+
+        base_name, ext = os.path.splitext(os.path.basename(image_path))
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality] if ext.lower() in ('.jpg', '.jpeg') else []
+        for flip, angle in self.variants:
+            matrix = self.variant_matrix(base, canvas, flip, angle)
+            output_name = base_name + self.variant_suffix(flip, angle)
+            output_image = self.warp(image, matrix, canvas)
+            cv2.imwrite(os.path.join(output_dir, output_name + ext), output_image, params)
+
+            if os.path.exists(label_path):
+                new_boxes, keep = transform_boxes(coordinates, matrix, (width, height), canvas)
+                write_labels(os.path.join(output_dir, output_name + '.txt'), class_ids[keep], new_boxes)
+
+    def process_directory(self, input_dir, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        for filename in os.listdir(input_dir):
+            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+                try:
+                    self.process(os.path.join(input_dir, filename), output_dir)
+                except Exception as e:
+                    print(f"Error processing image '{filename}': {e}")
+
+if __name__ == "__main__":
+    input_dir = r"c:\Users\jack\Desktop\removed"
+    output_dir = r"c:\Users\jack\Desktop\geometric"
+
+    # ResizeImg to 320, pad.py to 640 and then the flip.py / rotate.py variants, one warp each
+    pipeline = GeometricPipeline(
+        letterbox_size=(320, 320),
+        pad_size=(640, 640),
+        variants=[(False, 0), (True, 0), (False, 90)],
+        border_color=(255, 0, 0),  # pad.py's blue, in BGR
+    )
+    pipeline.process_directory(input_dir, output_dir)
+    print("Geometric variants and labels have been saved in the output directory.")
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import threading
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-1 of a file's content."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprint(paths):
+    """Sizes and mtimes of a source made of one or more files."""
+    stats = [os.stat(path) for path in paths]
+    return [stat.st_size for stat in stats], [stat.st_mtime_ns for stat in stats]
+
+def combined_hash(paths):
+    """Content hash of a source made of one or more files."""
+    if len(paths) == 1:
+        return file_hash(paths[0])
+    return hashlib.sha1(''.join(file_hash(path) for path in paths).encode('ascii')).hexdigest()
+
+def params_key(op, params):
+    """Stable string for an op name and its parameters, any change invalidates the manifest."""
+    return json.dumps({"op": op, "params": params}, sort_keys=True, default=repr)
+
+class Manifest:
+    """
+    Record of which sources an op has already turned into which outputs, for incremental re-runs.
+
+    Stored as .manifest-<op>.json in the output folder. Every source is keyed by file name and
+    remembers its content hash, size, mtime and the outputs written for it. Files the outputs
+    also depend on (e.g. the label copied next to an augmented image) can be passed as related
+    paths and are part of the source's fingerprint. A source is skipped
+    when its content hash still matches; the hash is only recomputed when size or mtime changed,
+    so an unchanged folder costs one stat per file. If the op parameters differ from the ones the
+    manifest was written with, every source is processed again.
+
+    Sources are matched by file name, not by content: the outputs are named after the source, so
+    a renamed source counts as a removed one (its outputs are deleted as stale) plus a new one
+    that is processed again, even if its content did not change.
+    """
+
+    def __init__(self, output_dir, op, params=None, save_every=500):
+        """
+        :param output_dir: Folder the op writes its outputs to
+        :param op: Name of the op, e.g. "PipelineFinal.process_images"
+        :param params: JSON-serializable description of everything that changes the outputs
+        :param save_every: Write the manifest after this many new records, a killed run keeps its progress
+        """
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, f".manifest-{op}.json")
+        self.key = params_key(op, params)
+        self.save_every = save_every
+        self.sources = {}
+        self._pending = {}
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as file:
+                stored = json.load(file)
+            if stored.get("key") == self.key:
+                self.sources = stored["sources"]
+            else:
+                # Keep the old outputs listed so they get replaced or removed, but match no source
+                self.sources = {name: {"hash": None, "size": None, "mtime": None, "outputs": record["outputs"]}
+                                for name, record in stored["sources"].items()}
+                print("Op parameters changed since the last run, processing every source again")
+
+    def needs_processing(self, source_path, related=()):
+        """True if the source (or a related file) is new or its content changed since its outputs were written."""
+        name = os.path.basename(source_path)
+        paths = [source_path] + list(related)
+        sizes, mtimes = fingerprint(paths)
+        record = self.sources.get(name)
+        if record and record["size"] == sizes and record["mtime"] == mtimes:
+            return False
+
+        content_hash = combined_hash(paths)
+        if record and record["hash"] == content_hash:
+            # Touched but not changed, remember the new mtime and keep the outputs
+            with self._lock:
+                record["size"], record["mtime"] = sizes, mtimes
+                self._unsaved += 1
+            return False
+
+        with self._lock:
+            self._pending[name] = {"hash": content_hash, "size": sizes, "mtime": mtimes}
+        return True
+
+    def record(self, source_path, outputs, related=()):
+        """Mark a source as done with the names of the outputs written for it."""
+        name = os.path.basename(source_path)
+        with self._lock:
+            record = self._pending.pop(name, None)
+            if record is None:
+                paths = [source_path] + list(related)
+                sizes, mtimes = fingerprint(paths)
+                record = {"hash": combined_hash(paths), "size": sizes, "mtime": mtimes}
+            old = self.sources.get(name)
+            # Outputs the source no longer produces
+            for output in set(old["outputs"]) - set(outputs) if old else ():
+                self._remove_output(output)
+            record["outputs"] = list(outputs)
+            self.sources[name] = record
+            self._unsaved += 1
+            if self._unsaved >= self.save_every:
+                self._save()
+
+    def _remove_output(self, output):
+        try:
+            os.remove(os.path.join(self.output_dir, output))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def remove_stale(self, source_names):
+        """Delete the outputs of every recorded source that is not in source_names. Returns the number of files removed."""
+        current = set(source_names)
+        removed = 0
+        with self._lock:
+            for name in [name for name in self.sources if name not in current]:
+                for output in self.sources.pop(name)["outputs"]:
+                    removed += self._remove_output(output)
+                self._unsaved += 1
+        return removed
+
+    def filter(self, input_dir, filenames, related=None):
+        """
+        Drop outputs of vanished sources and return the filenames that need processing.
+        Prints what was skipped and removed.
+
+        :param related: Optional function mapping a filename to the paths of its related files
+        """
+        removed = self.remove_stale(filenames)
+        todo = [f for f in filenames
+                if self.needs_processing(os.path.join(input_dir, f), related(f) if related else ())]
+        print(f"Incremental: {len(todo)} new or changed, {len(filenames) - len(todo)} up to date, "
+              f"{removed} stale outputs removed")
+        return todo
+
+    def _save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as file:
+            json.dump({"key": self.key, "sources": self.sources}, file)
+        os.replace(temp_path, self.path)
+        self._unsaved = 0
+
+    def save(self):
+        with self._lock:
+            self._save()
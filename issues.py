@@ -1,44 +1,47 @@
 import os
 from PIL import Image
 from AnnoteCheck import count_objects_per_class
+from labelio import read_labels, format_labels
 
 def check_bounding_boxes(annotation_file, image_path):
     with Image.open(image_path) as img:
         width, height = img.size
     
-    # Normalize dimensions inside the loop
+    # Normalize dimensions
     normalized_width = 1.0 / width
     normalized_height = 1.0 / height
     
-    with open(annotation_file, 'r') as file:
-        for line in file:
-            parts = line.strip().split()
-            if len(parts) != 5:
-                print(f"Invalid annotation format: {line}")
-                return False
-            
-            class_id, x_center, y_center, box_width, box_height = map(float, parts)
-            
-            # Check if coordinates are within bounds
-            if x_center < 0 or x_center > 1 or y_center < 0 or y_center > 1:
-                print(f"Out of bounds coordinates: {line}")
-                return False
-            
-            # Check if dimensions are correctly calculated
-            if box_width <= 0 or box_height <= 0 or box_width > 1 or box_height > 1:
-                print(f"Invalid bounding box dimensions: {line}")
-                return False
-            
-            # Normalize dimensions inside the loop
-            x_center_norm = x_center * normalized_width
-            y_center_norm = y_center * normalized_height
-            box_width_norm = box_width * normalized_width
-            box_height_norm = box_height * normalized_height
-            
-            if x_center_norm + box_width_norm > 1 or y_center_norm + box_height_norm > 1:
-                print(f"Normalized coordinates out of bounds: {line}")
-                return False
-    
+    errors = []
+    class_ids, boxes = read_labels(annotation_file, errors)
+    if errors:
+        print(f"Invalid annotation format: {errors[0][2]}")
+        return False
+
+    x_center, y_center, box_width, box_height = boxes.T
+
+    # Check if coordinates are within bounds
+    bad = (x_center < 0) | (x_center > 1) | (y_center < 0) | (y_center > 1)
+    if bad.any():
+        print(f"Out of bounds coordinates: {format_labels(class_ids[bad][:1], boxes[bad][:1])}")
+        return False
+
+    # Check if dimensions are correctly calculated
+    bad = (box_width <= 0) | (box_height <= 0) | (box_width > 1) | (box_height > 1)
+    if bad.any():
+        print(f"Invalid bounding box dimensions: {format_labels(class_ids[bad][:1], boxes[bad][:1])}")
+        return False
+
+    # Normalize dimensions for every box at once
+    x_center_norm = x_center * normalized_width
+    y_center_norm = y_center * normalized_height
+    box_width_norm = box_width * normalized_width
+    box_height_norm = box_height * normalized_height
+
+    bad = (x_center_norm + box_width_norm > 1) | (y_center_norm + box_height_norm > 1)
+    if bad.any():
+        print(f"Normalized coordinates out of bounds: {format_labels(class_ids[bad][:1], boxes[bad][:1])}")
+        return False
+
     return True
 
 def check_annotation_files(directory):
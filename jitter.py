@@ -1,62 +1,171 @@
 import cv2
 import numpy as np
 import os
-import shutil
+import sys
+import time
+from filelink import LinkStats, link_file, link_all_files
+from stages import run_stages
+from shards import encode_image, write_directory
+from journal import Journal, atomic_write, remove_partial
+from decode_cache import DecodeCache
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+def color_jitter(image, brightness_factor, contrast_factor, saturation_factor, hue_shift):
+    """
+    Apply brightness, contrast, saturation and hue changes to a BGR image in one pass.
+
+    Every step is a 256-entry lookup table: brightness and contrast are fused into a single
+    BGR table, saturation and hue are applied to the H and S channels of one HSV conversion.
+    """
+    # Brightness, same rounding and saturation as cv2.convertScaleAbs
+    bright = np.clip(np.rint(_LEVELS * brightness_factor), 0, 255)
+
+    # Contrast pivots around the mean of the brightened image, which the source histogram gives us
+    hist = cv2.calcHist([image.reshape(-1, 1)], [0], None, [256], [0, 256]).ravel()
+    mean = np.dot(hist, bright) / image.size
+    bc_lut = np.clip(np.rint(bright * contrast_factor - mean * (contrast_factor - 1)), 0, 255).astype(np.uint8)
+    image = cv2.LUT(image, bc_lut)
+
+    # Saturation and hue tables, V passes through unchanged
+    hsv_lut = np.empty((1, 256, 3), dtype=np.uint8)
+    hsv_lut[0, :, 0] = np.clip(_LEVELS + hue_shift * 180, 0, 179).astype(np.uint8)
+    hsv_lut[0, :, 1] = np.clip(_LEVELS * saturation_factor, 0, 255).astype(np.uint8)
+    hsv_lut[0, :, 2] = np.arange(256, dtype=np.uint8)
+
+    image_hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    image_hsv = cv2.LUT(image_hsv, hsv_lut)
+    return cv2.cvtColor(image_hsv, cv2.COLOR_HSV2BGR)
 
 def random_color_augmentation(image):
     brightness_factor = np.random.uniform(0.5, 1.5)
-    image = cv2.convertScaleAbs(image, alpha=brightness_factor)
-    
     contrast_factor = np.random.uniform(0.5, 1.5)
+    saturation_factor = np.random.uniform(0.5, 1.5)
+    hue_shift = np.random.uniform(-0.2, 0.2)
+    return color_jitter(image, brightness_factor, contrast_factor, saturation_factor, hue_shift)
+
+def _reference_color_jitter(image, brightness_factor, contrast_factor, saturation_factor, hue_shift):
+    """The original step-by-step implementation, kept to benchmark and check color_jitter against."""
+    image = cv2.convertScaleAbs(image, alpha=brightness_factor)
+
     mean = np.mean(image)
     image = cv2.addWeighted(image, contrast_factor, image, 0, -mean * (contrast_factor - 1))
-    
-    saturation_factor = np.random.uniform(0.5, 1.5)
+
     image_hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
     image_hsv[:, :, 1] = np.clip(image_hsv[:, :, 1] * saturation_factor, 0, 255)
     image = cv2.cvtColor(image_hsv, cv2.COLOR_HSV2BGR)
-    
-    hue_shift = np.random.uniform(-0.2, 0.2)
+
     image_hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
     image_hsv[:, :, 0] = np.clip(image_hsv[:, :, 0] + hue_shift * 180, 0, 179)
     image = cv2.cvtColor(image_hsv, cv2.COLOR_HSV2BGR)
-    
+
     return image
 
-def copy_all_files(input_dir, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    for filename in os.listdir(input_dir):
-        file_path = os.path.join(input_dir, filename)
-        if os.path.isfile(file_path):
-            shutil.copy(file_path, output_dir)
-
-def process_images_and_texts(input_dir, output_dir):
-    copy_all_files(input_dir, output_dir)
-
-    for filename in os.listdir(input_dir):
-        if filename.endswith(".jpg") or filename.endswith(".png"):
-            image_path = os.path.join(input_dir, filename)
-            image = cv2.imread(image_path)
-            if image is None:
-                print(f"Failed to read image: {image_path}")
-                continue
-
-            augmented_image = random_color_augmentation(image)
-            new_filename = "jitter2_" + filename
-            cv2.imwrite(os.path.join(output_dir, new_filename), augmented_image)
-
-            # use here to copy and rename .txt file
-            txt_filename = filename.rsplit('.', 1)[0] + '.txt'
-            txt_path = os.path.join(input_dir, txt_filename)
+def benchmark_color_augmentation(sizes=((640, 640), (1920, 1080)), repeats=50):
+    """Time the reference and LUT colour jitter on random frames and report the speedup and mean difference."""
+    rng = np.random.RandomState(0)
+    for width, height in sizes:
+        image = cv2.GaussianBlur(rng.randint(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+        params = [(rng.uniform(0.5, 1.5), rng.uniform(0.5, 1.5), rng.uniform(0.5, 1.5), rng.uniform(-0.2, 0.2))
+                  for _ in range(repeats)]
+
+        timings = {}
+        for name, func in (("reference", _reference_color_jitter), ("lut", color_jitter)):
+            start = time.perf_counter()
+            for p in params:
+                func(image, *p)
+            timings[name] = (time.perf_counter() - start) / repeats * 1000
+
+        diff = np.mean([np.mean(cv2.absdiff(_reference_color_jitter(image, *p), color_jitter(image, *p)))
+                        for p in params[:10]])
+        print(f"{width}x{height}: reference {timings['reference']:.2f} ms, lut {timings['lut']:.2f} ms, "
+              f"speedup {timings['reference'] / timings['lut']:.2f}x, mean abs diff {diff:.2f}")
+
+def copy_all_files(input_dir, output_dir, link_strategy="copy", stats=None, journal=None):
+    link_all_files(input_dir, output_dir, link_strategy, stats, journal)
+
+def process_images_and_texts(input_dir, output_dir, link_strategy="copy", readers=2, writers=2, queue_size=8,
+                             sink=None, cache_dir=None, resume=False):
+    """
+    Write an augmented copy of every image and its label into output_dir, next to the originals.
+    link_strategy (hardlink, reflink, symlink or copy) decides how the unchanged originals
+    and labels get there, see filelink.py. Decoding and encoding run in reader and writer threads
+    next to the op, see stages.run_stages for readers, writers and queue_size.
+    With a sink (shards.ShardWriter or DirectoryWriter) the originals and the augmented samples
+    are written to the sink instead of output_dir.
+    With cache_dir, decoded pixels are kept in a DecodeCache there and reused by later runs.
+    Outputs are written to a temporary name and renamed into place, and every finished image is
+    appended to .journal-jitter.jsonl in output_dir. With resume, the items in that journal are
+    skipped, so a run that was killed carries on where it stopped.
+    """
+    if resume and sink is not None:
+        raise ValueError("resume needs output_dir, a sink cannot be resumed")
+
+    stats = LinkStats()
+    journal = None
+    if sink is None:
+        os.makedirs(output_dir, exist_ok=True)
+        if resume:
+            removed = remove_partial(output_dir)
+            if removed:
+                print(f"Removed {removed} partially written files")
+        journal = Journal(os.path.join(output_dir, ".journal-jitter.jsonl"), resume)
+        copy_all_files(input_dir, output_dir, link_strategy, stats, journal)
+    else:
+        write_directory(sink, input_dir)
+
+    filenames = [f for f in os.listdir(input_dir) if f.endswith(".jpg") or f.endswith(".png")]
+    if journal is not None:
+        filenames = journal.pending(filenames)
+    cache = DecodeCache(cache_dir) if cache_dir else None
+
+    def read(filename):
+        image_path = os.path.join(input_dir, filename)
+        image = cache.load(image_path) if cache is not None else cv2.imread(image_path)
+        if image is None:
+            print(f"Failed to read image: {image_path}")
+        return image
+
+    def write(filename, augmented_image):
+        new_filename = "jitter2_" + filename
+        txt_filename = filename.rsplit('.', 1)[0] + '.txt'
+        txt_path = os.path.join(input_dir, txt_filename)
+
+        if sink is not None:
+            key, ext = os.path.splitext(new_filename)
+            files = {ext[1:]: encode_image(augmented_image, ext)}
             if os.path.exists(txt_path):
-                new_txt_filename = "jitter2_" + txt_filename
-                shutil.copy(txt_path, os.path.join(output_dir, new_txt_filename))
+                with open(txt_path, 'rb') as file:
+                    files["txt"] = file.read()
+            sink.write_sample(key, files)
+            return
+
+        ext = os.path.splitext(new_filename)[1]
+        atomic_write(os.path.join(output_dir, new_filename), encode_image(augmented_image, ext))
+
+        # use here to copy and rename .txt file
+        if os.path.exists(txt_path):
+            new_txt_filename = "jitter2_" + txt_filename
+            link_file(txt_path, os.path.join(output_dir, new_txt_filename), link_strategy, stats)
+        journal.mark_done(filename)
+
+    run_stages(filenames, read, lambda filename, image: random_color_augmentation(image), write,
+               readers, writers, queue_size).report()
+    if sink is None:
+        journal.close()
+        print(f"Link strategy: {link_strategy}")
+        stats.report()
+    if cache is not None:
+        cache.report()
+        cache.close()
 
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        benchmark_color_augmentation()
+        sys.exit()
+
     input_dir = r'c:\Users\Kygo\Desktop\valcrop'
     output_dir = r'C:\Users\Kygo\Desktop\train'
     input_dir = r'c:\Users\Kygo\Desktop\valCrop'
     output_dir = r'C:\Users\Kygo\Desktop\val'
-    process_images_and_texts(input_dir, output_dir)
+    process_images_and_texts(input_dir, output_dir, link_strategy="copy", resume="--resume" in sys.argv)
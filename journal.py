@@ -0,0 +1,108 @@
+import glob
+import json
+import os
+import shutil
+import threading
+
+def temp_path(path):
+    """Hidden temporary name next to path, unique per process and thread."""
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+def _replace(write, path):
+    temp = temp_path(path)
+    try:
+        write(temp)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+def atomic_write(path, data):
+    """Write bytes or text to a temporary file and rename it over path, readers never see a partial file."""
+    def write(temp):
+        with open(temp, 'wb' if isinstance(data, bytes) else 'w') as file:
+            file.write(data)
+    _replace(write, path)
+
+def atomic_copy(src, dst, metadata=False):
+    """Copy src to dst through a temporary file. With metadata, timestamps are kept like shutil.copy2."""
+    _replace(lambda temp: (shutil.copy2 if metadata else shutil.copy)(src, temp), dst)
+
+def remove_partial(directory):
+    """Delete temporary files a killed run left in directory. Returns the number removed."""
+    removed = 0
+    for path in glob.glob(os.path.join(glob.escape(directory), ".*.tmp")):
+        os.remove(path)
+        removed += 1
+    return removed
+
+class Journal:
+    """
+    Append-only record of the items a batch run has finished, so a killed run can resume.
+
+    Every finished item is one JSON line, appended and flushed after its outputs were renamed
+    into place, so an item in the journal always has complete outputs. Resuming costs one read
+    of the journal, outputs are neither scanned nor hashed. A line torn by a crash is ignored
+    and its item is simply done again.
+    """
+
+    def __init__(self, path, resume=False, sync=False):
+        """
+        :param path: Journal file, usually .journal-<op>.jsonl in the output folder
+        :param resume: Keep the items of an earlier run, otherwise the journal starts empty
+        :param sync: fsync after every item, survives power loss and not just a killed process
+        """
+        self.path = path
+        self.sync = sync
+        self.done = {}
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line of a run that was killed
+                    self.done[entry["item"]] = entry.get("data")
+        self._file = open(path, 'a' if resume else 'w')
+
+    def __contains__(self, item):
+        return item in self.done
+
+    def __len__(self):
+        return len(self.done)
+
+    def get(self, item, default=None):
+        """Data stored with a finished item."""
+        return self.done.get(item, default)
+
+    def mark_done(self, item, data=None):
+        """Record a finished item, with optional JSON-serializable data to get back on resume."""
+        line = json.dumps({"item": item, "data": data} if data is not None else {"item": item})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+            self.done[item] = data
+
+    def pending(self, items):
+        """Return the items that are not finished yet and print how many were skipped."""
+        todo = [item for item in items if item not in self.done]
+        if len(todo) < len(items):
+            print(f"Resume: {len(items) - len(todo)} items already done, {len(todo)} left")
+        return todo
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
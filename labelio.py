@@ -0,0 +1,231 @@
+import os
+import numpy as np
+from journal import atomic_write
+
+# One rule for every tool: a label line is "<class> <x_center> <y_center> <width> <height>".
+# The class may carry a trailing ':' (some exports write "3: ..."), it must be a whole number.
+# Blank lines are ignored, any other line is skipped and reported through the errors list.
+# Tools that must also carry polygon (segmentation) lines use parse_label_rows instead.
+
+def _parse_slow(text, source, errors):
+    rows = []
+    for line_num, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            if len(parts) != 5:
+                raise ValueError("expected 5 fields")
+            class_id = float(parts[0].rstrip(':'))
+            if not class_id.is_integer():
+                raise ValueError("class id is not a whole number")
+            rows.append([class_id] + [float(p) for p in parts[1:]])
+        except ValueError:
+            if errors is not None:
+                errors.append((source, line_num, line.strip()))
+    return np.array(rows, dtype=np.float64).reshape(-1, 5)
+
+def _box_rows(text):
+    # Number of rows if every line between the first and last non-blank one has exactly 5 fields,
+    # None otherwise: a blank line in the middle, a polygon, a short line next to a long one or a
+    # "3:" class all send the file down the slow path
+    text = text.strip()
+    if not text:
+        return 0
+    if ':' in text:
+        return None
+    lines = text.split('\n')
+    return len(lines) if set(map(len, map(str.split, lines))) == {5} else None
+
+def _parse(text, source, errors):
+    """Parse label text into an N x 5 float64 array, one C-level conversion for well-formed files."""
+    if _box_rows(text) is not None:
+        try:
+            data = np.array(text.split(), dtype=np.float64).reshape(-1, 5)
+        except ValueError:
+            data = None
+        if data is not None and np.all(data[:, 0] == np.floor(data[:, 0])):
+            return data
+    return _parse_slow(text, source, errors)
+
+def _split(data):
+    return data[:, 0].astype(np.int32), data[:, 1:5].astype(np.float32)
+
+def parse_labels(text, source=None, errors=None):
+    """
+    Parse YOLO label text.
+
+    Returns:
+    - class_ids: N int32 array.
+    - boxes: N x 4 float32 array of normalized (x_center, y_center, width, height).
+    Malformed lines are skipped, and appended to errors as (source, line_num, line) if given.
+    """
+    return _split(_parse(text, source, errors))
+
+def read_labels(label_path, errors=None):
+    """Read one YOLO label file into (class_ids, boxes). A missing file reads as no labels."""
+    if not os.path.exists(label_path):
+        return _split(np.empty((0, 5)))
+    with open(label_path, 'r') as file:
+        return parse_labels(file.read(), label_path, errors)
+
+def parse_label_rows(text, source=None, errors=None):
+    """
+    Parse YOLO label text that may hold polygon (segmentation) lines as well as boxes.
+
+    Returns (class_ids, rows). rows is the N x 4 box array of parse_labels when every line is
+    a box, otherwise an N object array with the coordinates of each line as written, so polygon
+    lines survive a remap or a filter and are written back unchanged by format_labels.
+    Lines whose class is not a whole number are skipped, and appended to errors as
+    (source, line_num, line) if given.
+    """
+    box_errors = []
+    class_ids, boxes = parse_labels(text, source, box_errors)
+    if not box_errors:
+        return class_ids, boxes
+
+    ids = []
+    fields = []
+    for line_num, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            class_id = float(parts[0].rstrip(':'))
+            if not class_id.is_integer():
+                raise ValueError("class id is not a whole number")
+        except ValueError:
+            if errors is not None:
+                errors.append((source, line_num, line.strip()))
+            continue
+        ids.append(int(class_id))
+        fields.append(' '.join(parts[1:]))
+    rows = np.empty(len(fields), dtype=object)
+    rows[:] = fields
+    return np.array(ids, dtype=np.int32), rows
+
+def read_label_rows(label_path, errors=None):
+    """Read one YOLO label file into (class_ids, rows), see parse_label_rows. A missing file reads as no labels."""
+    if not os.path.exists(label_path):
+        return _split(np.empty((0, 5)))
+    with open(label_path, 'r') as file:
+        return parse_label_rows(file.read(), label_path, errors)
+
+def read_label_dir(directory, errors=None):
+    """
+    Read every .txt label file in a directory (except classes.txt) into contiguous arrays.
+
+    Returns:
+    - names: List of label file names, in the order their rows appear.
+    - class_ids: Total-N int32 array.
+    - boxes: Total-N x 4 float32 array.
+    - offsets: len(names) + 1 int64 array, rows offsets[i]:offsets[i + 1] belong to names[i].
+    """
+    names = sorted(f for f in os.listdir(directory) if f.endswith('.txt') and not f.startswith('classes'))
+    parts = [None] * len(names)
+    pending = []  # (index, first row, rows) of well-formed files, converted together below
+    tokens = []
+    paths = [os.path.join(directory, name) for name in names]
+    for i, path in enumerate(paths):
+        with open(path, 'r') as file:
+            text = file.read()
+        lines = _box_rows(text)
+        if lines is not None:
+            pending.append((i, len(tokens) // 5, lines))
+            tokens.extend(text.split())
+        else:
+            parts[i] = _parse_slow(text, path, errors)
+
+    try:
+        fast = np.array(tokens, dtype=np.float64).reshape(-1, 5)
+    except ValueError:
+        # A stray non-numeric token somewhere, fall back to file by file below
+        fast = None
+
+    if fast is not None and len(pending) == len(names) and np.all(fast[:, 0] == np.floor(fast[:, 0])):
+        data = fast
+        counts = [rows for _, _, rows in pending]
+    else:
+        for i, first, rows in pending:
+            chunk = fast[first:first + rows] if fast is not None else None
+            if chunk is None or not np.all(chunk[:, 0] == np.floor(chunk[:, 0])):
+                with open(paths[i], 'r') as file:
+                    chunk = _parse_slow(file.read(), paths[i], errors)
+            parts[i] = chunk
+        data = np.concatenate(parts) if parts else np.empty((0, 5))
+        counts = [len(part) for part in parts]
+
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    class_ids, boxes = _split(data)
+    return names, class_ids, boxes, offsets
+
+def format_labels(class_ids, boxes, precision=6):
+    """
+    Format labels as YOLO text with a fixed number of decimals, in a single string operation.
+    Object rows from parse_label_rows are written back as they were read.
+    """
+    if isinstance(boxes, np.ndarray) and boxes.dtype == object:
+        return ''.join(f"{class_id} {fields}".rstrip() + '\n'
+                       for class_id, fields in zip(np.asarray(class_ids).tolist(), boxes.tolist()))
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    if len(boxes) == 0:
+        return ''
+    line = '%d' + f' %.{precision}f' * 4 + '\n'
+    data = np.column_stack([np.asarray(class_ids, dtype=np.float64), boxes])
+    return (line * len(data)) % tuple(data.ravel().tolist())
+
+def write_labels(label_path, class_ids, boxes, precision=6):
+    """
+    Write labels to a YOLO .txt file with a fixed number of decimals. The file is written under a
+    temporary name and renamed into place, so a hardlinked label is replaced, never written through.
+    """
+    atomic_write(label_path, format_labels(class_ids, boxes, precision))
+
+def remap_label_lines(text, mapping, source=None, errors=None):
+    """
+    Remap the class of every line of YOLO label text and keep the rest of each line as written,
+    so polygon (segmentation) lines and any other line that is not a 5-field box survive a remap.
+    Lines whose class is not a whole number are kept unchanged, and appended to errors as
+    (source, line_num, line) if given. Blank lines are dropped.
+
+    Returns:
+    - The remapped text.
+    - Sorted list of the class ids that were not in the mapping, their lines are kept unchanged.
+    """
+    lines = []
+    unmapped = set()
+    for line_num, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            class_id = float(parts[0].rstrip(':'))
+            if not class_id.is_integer():
+                raise ValueError("class id is not a whole number")
+        except ValueError:
+            if errors is not None:
+                errors.append((source, line_num, line.strip()))
+            lines.append(line.strip() + '\n')
+            continue
+        if int(class_id) in mapping:
+            parts[0] = str(mapping[int(class_id)])
+            lines.append(' '.join(parts) + '\n')
+        else:
+            unmapped.add(int(class_id))
+            lines.append(line.strip() + '\n')
+    return ''.join(lines), sorted(unmapped)
+
+def remap_class_ids(class_ids, mapping):
+    """
+    Map class ids through a {old: new} dict in one lookup. Ids missing from the mapping keep their value.
+    Returns (new class_ids, boolean mask of the ids that were in the mapping).
+    """
+    class_ids = np.asarray(class_ids, dtype=np.int64)
+    size = max([int(class_ids.max()) if len(class_ids) else -1] + [int(k) for k in mapping]) + 1
+    lookup = np.arange(max(size, 0), dtype=np.int64)
+    mapped = np.zeros(len(lookup), dtype=bool)
+    for old, new in mapping.items():
+        lookup[old] = new
+        mapped[old] = True
+    return lookup[class_ids].astype(np.int32), mapped[class_ids]
@@ -1,22 +1,31 @@
 import os
 from PIL import Image
-import shutil
-
-# Define the source and output directories
-source_dir = r'c:\Users\jack\Desktop\aspect-320'
-output_dir = r'c:\Users\jack\Desktop\pad'
-
-# Ensure the output directory exists
-os.makedirs(output_dir, exist_ok=True)
+from boxes import translation_matrix, transform_boxes
+from labelio import read_labels, write_labels, format_labels
+from stages import run_stages
+from shards import encode_pil
 
 # Define the target size for padding
 target_size = (640, 640)
 
-def process_image(image_path, output_dir):
-    """Pad an image to the target size."""
-    # Load the image
+def read_sample(image_path):
+    """Decode an image and read its label file if it has one. Returns (image, class_ids, boxes)."""
+    # Load the image, Image.open alone only reads the header
     img = Image.open(image_path)
+    img.load()
 
+    source_txt_path = os.path.splitext(image_path)[0] + '.txt'
+    if not os.path.exists(source_txt_path):
+        return img, None, None
+
+    errors = []
+    class_ids, coordinates = read_labels(source_txt_path, errors)
+    for _, _, line in errors:
+        print(f"Warning: Skipping line '{line}' due to non-numerical values.")
+    return img, class_ids, coordinates
+
+def pad_sample(img, class_ids, coordinates):
+    """Pad an image and its boxes to the target size. Returns (padded image, class_ids, boxes)."""
     # Get the current size of the image
     current_width, current_height = img.size
 
@@ -30,48 +39,66 @@ def process_image(image_path, output_dir):
     # Paste the original image onto the padded image
     padded_img.paste(img, (pad_width, pad_height))
 
+    if class_ids is None:
+        return padded_img, None, None
+
+    # Update coordinates based on the padding, the paste offset is a pure translation
+    padded, keep = transform_boxes(coordinates, translation_matrix(pad_width, pad_height), img.size, target_size)
+    return padded_img, class_ids[keep], padded
+
+def save_sample(image_path, output_dir, sample, sink=None):
+    """Save a padded sample with '_padded' appended to its name, to output_dir or a shards sink."""
+    padded_img, class_ids, padded = sample
+
     # Construct the output path for the padded image
     output_image_name = os.path.splitext(os.path.basename(image_path))[0] + '_padded' + os.path.splitext(image_path)[1]
+    if sink is not None:
+        key, ext = os.path.splitext(output_image_name)
+        files = {ext[1:]: encode_pil(padded_img, ext)}
+        if class_ids is not None:
+            files["txt"] = format_labels(class_ids, padded).encode('utf-8')
+        sink.write_sample(key, files)
+        return
+
     output_image_path = os.path.join(output_dir, output_image_name)
 
     # Save the padded image
     padded_img.save(output_image_path)
 
-    # Construct the output path for the corresponding .txt file
-    txt_file = os.path.splitext(os.path.basename(image_path))[0] + '.txt'
-    source_txt_path = os.path.join(source_dir, txt_file)
-    output_txt_name = os.path.splitext(output_image_name)[0] + '.txt'
-    output_txt_path = os.path.join(output_dir, output_txt_name)
-
-    # Copy the .txt file to the output directory with the new name and update coordinates
-    if os.path.exists(source_txt_path):
-        with open(source_txt_path, 'r') as infile, open(output_txt_path, 'w') as outfile:
-            for line in infile:
-                try:
-                    components = line.strip().split(' ')
-                    class_index = components[0]
-                    x_center = float(components[1])
-                    y_center = float(components[2])
-                    width = float(components[3])
-                    height = float(components[4])
-
-                    # Update coordinates based on the padding and resizing
-                    new_x_center = (x_center * current_width + pad_width) / target_size[0]
-                    new_y_center = (y_center * current_height + pad_height) / target_size[1]
-                    new_width = width * current_width / target_size[0]
-                    new_height = height * current_height / target_size[1]
-
-                    outfile.write(f"{class_index} {new_x_center:.6f} {new_y_center:.6f} {new_width:.6f} {new_height:.6f}\n")
-                except ValueError:
-                    print(f"Warning: Skipping line '{line.strip()}' due to non-numerical values.")
-
-# Iterate over all files in the source directory
-for filename in os.listdir(source_dir):
+    # Write the .txt file to the output directory with the new name and updated coordinates
+    if class_ids is not None:
+        output_txt_name = os.path.splitext(output_image_name)[0] + '.txt'
+        write_labels(os.path.join(output_dir, output_txt_name), class_ids, padded)
+
+def process_image(image_path, output_dir):
+    """Pad an image to the target size."""
+    save_sample(image_path, output_dir, pad_sample(*read_sample(image_path)))
+
+def process_directory(source_dir, output_dir, readers=2, writers=2, queue_size=8, sink=None):
+    """
+    Pad every image in source_dir into output_dir, or into sink if given.
+    Decoding and encoding run in reader and writer threads, see stages.run_stages.
+    """
+    # Ensure the output directory exists
+    if sink is None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Iterate over all files in the source directory
     # Check if the file is an image (e.g., .jpg, .png)
-    if filename.endswith(('.jpg', '.png')):
-        # Construct the full path to the image
-        image_path = os.path.join(source_dir, filename)
+    image_paths = [os.path.join(source_dir, filename) for filename in os.listdir(source_dir)
+                   if filename.endswith(('.jpg', '.png'))]
+
+    run_stages(image_paths,
+               read_sample,
+               lambda image_path, sample: pad_sample(*sample),
+               lambda image_path, sample: save_sample(image_path, output_dir, sample, sink),
+               readers, writers, queue_size).report()
+
+if __name__ == "__main__":
+    # Define the source and output directories
+    source_dir = r'c:\Users\jack\Desktop\aspect-320'
+    output_dir = r'c:\Users\jack\Desktop\pad'
 
-        process_image(image_path, output_dir)
+    process_directory(source_dir, output_dir)
 
-print("Images have been padded and copied to the output directory with '_padded' appended to their names.")
\ No newline at end of file
+    print("Images have been padded and copied to the output directory with '_padded' appended to their names.")
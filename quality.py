@@ -0,0 +1,212 @@
+import argparse
+import csv
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+
+try:
+    import pandas as pd
+except ImportError:  # CSV only
+    pd = None
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Gray levels at or below / at or above these count as crushed shadows / blown highlights
+DARK_LEVEL = 5
+BRIGHT_LEVEL = 250
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+def score_gray(gray, size=320):
+    """
+    Score a grayscale uint8 image on a copy whose longer side is at most size pixels.
+
+    Returns a dict with:
+    - sharpness: variance of the Laplacian, low for blurred or out of focus images. It depends on
+      the scoring size, thresholds only carry over between runs with the same size.
+    - brightness: mean gray level (0-255), low for under-exposed images.
+    - clipped: fraction of pixels at or below DARK_LEVEL or at or above BRIGHT_LEVEL.
+    """
+    height, width = gray.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        gray = cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))),
+                          interpolation=cv2.INTER_AREA)
+
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_32F))
+    # Brightness and clipping both come from one histogram
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+    pixels = hist.sum()
+    return {
+        "sharpness": float(std[0, 0] ** 2),
+        "brightness": float(np.dot(hist, _LEVELS) / pixels),
+        "clipped": float((hist[:DARK_LEVEL + 1].sum() + hist[BRIGHT_LEVEL:].sum()) / pixels),
+    }
+
+def score_frame(frame, size=320):
+    """Score a decoded BGR frame, see score_gray. The frame is shrunk before the colour conversion."""
+    height, width = frame.shape[:2]
+    scale = size / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    return score_gray(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame, size)
+
+def score_file(image_path, size=320):
+    """
+    Score an image file, see score_gray. JPEGs are decoded in grayscale at a reduced scale
+    (Image.draft), the scoring copy is small so most of the full decode would be thrown away.
+    """
+    with Image.open(image_path) as image:
+        image.draft('L', (size, size))  # No-op for anything but JPEG
+        gray = np.asarray(image.convert('L'))
+    return score_gray(gray, size)
+
+class QualityGate:
+    """
+    Thresholds that a frame's scores must meet. A threshold left at None is not checked, so a
+    gate without thresholds only scores.
+    """
+
+    def __init__(self, min_sharpness=None, min_brightness=None, max_brightness=None, max_clipped=None, size=320):
+        """
+        :param min_sharpness: Lowest Laplacian variance, e.g. 100 at the default size for a blur check
+        :param min_brightness: Lowest mean gray level, e.g. 40 for under-exposure
+        :param max_brightness: Highest mean gray level, e.g. 220 for over-exposure
+        :param max_clipped: Highest fraction of crushed or blown pixels, e.g. 0.25
+        :param size: Longer side of the scoring copy
+        """
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.size = size
+
+    def reasons(self, scores):
+        """Names of the checks the scores fail, empty if they pass."""
+        failed = []
+        if self.min_sharpness is not None and scores["sharpness"] < self.min_sharpness:
+            failed.append("blurred")
+        if self.min_brightness is not None and scores["brightness"] < self.min_brightness:
+            failed.append("dark")
+        if self.max_brightness is not None and scores["brightness"] > self.max_brightness:
+            failed.append("bright")
+        if self.max_clipped is not None and scores["clipped"] > self.max_clipped:
+            failed.append("clipped")
+        return failed
+
+    def _row(self, scores):
+        failed = self.reasons(scores)
+        scores["passed"] = not failed
+        scores["reasons"] = ";".join(failed)
+        return scores
+
+    def check_frame(self, frame):
+        """Score a BGR frame. Returns the scores with "passed" and "reasons" added."""
+        return self._row(score_frame(frame, self.size))
+
+    def check_file(self, image_path):
+        """Score an image file. Returns the scores with "passed" and "reasons" added."""
+        return self._row(score_file(image_path, self.size))
+
+def check_index_path(index_path):
+    """Raise ImportError if index_path cannot be written here, call it before doing any work."""
+    if index_path is not None and index_path.endswith('.parquet') and pd is None:
+        raise ImportError("Writing a Parquet index needs pandas, use a .csv path instead")
+
+def write_scores(rows, index_path):
+    """
+    Write score rows (dicts with the same keys) to index_path.
+    A .parquet path is written with pandas (which needs pyarrow or fastparquet), anything else as CSV.
+    """
+    check_index_path(index_path)
+    if index_path.endswith('.parquet'):
+        pd.DataFrame(rows).to_parquet(index_path, index=False)
+        return
+    with open(index_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]) if rows else ["filename"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+def score_folder(image_dir, gate=None, workers=None):
+    """
+    Score every image in image_dir in a thread pool (decoding and the OpenCV ops release the GIL).
+    Returns one row per image, in file name order: filename, the scores, passed and reasons.
+    """
+    if gate is None:
+        gate = QualityGate()
+    filenames = sorted(f for f in os.listdir(image_dir) if f.lower().endswith(IMAGE_EXTENSIONS))
+
+    def score(filename):
+        try:
+            return {"filename": filename, **gate.check_file(os.path.join(image_dir, filename))}
+        except Exception as e:
+            print(f"Error scoring '{filename}': {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        return [row for row in pool.map(score, filenames) if row is not None]
+
+def gate_folder(image_dir, gate, index_path=None, reject_dir=None, workers=None):
+    """
+    Score an image folder, write the scores to an index and optionally move the images that fail
+    the gate (with their .txt labels) to reject_dir, so the rest of the pipeline never sees them.
+
+    Parameters:
+    - image_dir: Folder of images, e.g. frames extracted by FrameConvert.
+    - gate: QualityGate with the thresholds to apply.
+    - index_path: Optional .csv or .parquet file for the scores of every image.
+    - reject_dir: Optional folder to move failing images to, None only reports them.
+    - workers: Number of scoring threads (default: os.cpu_count()).
+
+    Returns:
+    - The score rows.
+    """
+    # Fail before anything is moved, a lost index would leave the rejects untraceable
+    check_index_path(index_path)
+    start = time.perf_counter()
+    rows = score_folder(image_dir, gate, workers)
+    rejected = [row for row in rows if not row["passed"]]
+
+    if reject_dir is not None and rejected:
+        os.makedirs(reject_dir, exist_ok=True)
+        for row in rejected:
+            shutil.move(os.path.join(image_dir, row["filename"]), os.path.join(reject_dir, row["filename"]))
+            label_name = os.path.splitext(row["filename"])[0] + '.txt'
+            if os.path.exists(os.path.join(image_dir, label_name)):
+                shutil.move(os.path.join(image_dir, label_name), os.path.join(reject_dir, label_name))
+
+    if index_path is not None:
+        write_scores(rows, index_path)
+
+    elapsed = time.perf_counter() - start
+    rate = len(rows) / elapsed if elapsed > 0 else 0.0
+    counts = {}
+    for row in rejected:
+        for reason in row["reasons"].split(";"):
+            counts[reason] = counts.get(reason, 0) + 1
+    details = ", ".join(f"{count} {reason}" for reason, count in sorted(counts.items()))
+    action = f"moved to {reject_dir}" if reject_dir is not None else "kept in place"
+    print(f"Scored {len(rows)} images in {elapsed:.1f}s ({rate:.1f} img/s), "
+          f"{len(rejected)} failed the gate ({details or 'none'}), {action}")
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score images for blur and exposure and drop the bad ones.")
+    parser.add_argument("image_dir", help="Folder of images to score")
+    parser.add_argument("--index", default=None, help="Write the scores to this .csv or .parquet file")
+    parser.add_argument("--reject-dir", default=None, help="Move failing images and their labels here")
+    parser.add_argument("--min-sharpness", type=float, default=None)
+    parser.add_argument("--min-brightness", type=float, default=None)
+    parser.add_argument("--max-brightness", type=float, default=None)
+    parser.add_argument("--max-clipped", type=float, default=None)
+    parser.add_argument("--size", type=int, default=320, help="Longer side of the scoring copy")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    gate = QualityGate(args.min_sharpness, args.min_brightness, args.max_brightness, args.max_clipped, args.size)
+    gate_folder(args.image_dir, gate, args.index, args.reject_dir, args.workers)
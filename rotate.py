@@ -1,27 +1,7 @@
 import os
 from PIL import Image
-import math
-
-# Define the source and output directories
-source_dir = r'c:\Users\Kygo\Desktop\rotate'
-output_dir = r'c:\Users\Kygo\Desktop\output'
-
-# Ensure the output directory exists
-os.makedirs(output_dir, exist_ok=True)
-
-def rotate_coordinates(x_center, y_center, width, height, angle):
-    """
-    Rotate the bounding box coordinates by the given angle.
-    """
-    # Convert angle from degrees to radians
-    angle_rad = math.radians(angle)
-    
-    # Calculate the new coordinates
-    new_x_center = x_center * math.cos(angle_rad) - y_center * math.sin(angle_rad)
-    new_y_center = x_center * math.sin(angle_rad) + y_center * math.cos(angle_rad)
-    
-    # The width and height remain the same
-    return new_x_center, new_y_center, width, height
+from boxes import rotation_matrix, invert, transform_boxes
+from labelio import read_labels, write_labels
 
 def process_image_and_label(image_path, label_path, output_dir, angle):
     """
@@ -29,8 +9,10 @@ def process_image_and_label(image_path, label_path, output_dir, angle):
     """
     # Load the image
     img = Image.open(image_path)
-    # Rotate the image
-    rotated_img = img.rotate(angle)
+    # Rotate the image about its centre, counter-clockwise, keeping its size like Image.rotate.
+    # The pixels and the labels go through the same matrix so the boxes stay exact.
+    matrix = rotation_matrix(img.width, img.height, angle)
+    rotated_img = img.transform(img.size, Image.AFFINE, tuple(invert(matrix).ravel()), Image.NEAREST)
     # Construct the output path for the rotated image
     output_image_name = os.path.splitext(os.path.basename(image_path))[0] + f'_rotate_{angle}' + os.path.splitext(image_path)[1]
     output_image_path = os.path.join(output_dir, output_image_name)
@@ -41,33 +23,38 @@ def process_image_and_label(image_path, label_path, output_dir, angle):
     output_label_name = os.path.splitext(os.path.basename(label_path))[0] + f'_rotate_{angle}.txt'
     output_label_path = os.path.join(output_dir, output_label_name)
     
-    # Rotate the coordinates in the label file
-    with open(label_path, 'r') as infile, open(output_label_path, 'w') as outfile:
-        for line in infile:
-            components = line.strip().split(' ')
-            class_index = components[0]
-            x_center = float(components[1])
-            y_center = float(components[2])
-            width = float(components[3])
-            height = float(components[4])
-            
-            rotated_x_center, rotated_y_center, rotated_width, rotated_height = rotate_coordinates(x_center, y_center, width, height, angle)
-            
-            outfile.write(f"{class_index} {rotated_x_center} {rotated_y_center} {rotated_width} {rotated_height}\n")
+    # Read the label file
+    errors = []
+    class_ids, coordinates = read_labels(label_path, errors)
+    for _, _, line in errors:
+        print(f"Warning: Skipping line '{line}' due to non-numerical values.")
+
+    # Rotate all box corners at once and take the axis-aligned box around them,
+    # boxes rotated out of the frame are dropped
+    rotated, keep = transform_boxes(coordinates, matrix, img.size)
+    write_labels(output_label_path, class_ids[keep], rotated)
 
-# Define the rotation angle
-angle = 90 # Rotate by 90 degrees
+if __name__ == "__main__":
+    # Define the source and output directories
+    source_dir = r'c:\Users\Kygo\Desktop\rotate'
+    output_dir = r'c:\Users\Kygo\Desktop\output'
 
-# Iterate over all files in the source directory
-for filename in os.listdir(source_dir):
-    # Check if the file is an image (e.g., .jpg, .png)
-    if filename.endswith(('.jpg', '.png')):
-        # Construct the full path to the image and its corresponding label file
-        image_path = os.path.join(source_dir, filename)
-        label_path = os.path.join(source_dir, os.path.splitext(filename)[0] + '.txt')
-        
-        # Check if the label file exists
-        if os.path.exists(label_path):
-            process_image_and_label(image_path, label_path, output_dir, angle)
+    # Ensure the output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Define the rotation angle
+    angle = 90 # Rotate by 90 degrees
+
+    # Iterate over all files in the source directory
+    for filename in os.listdir(source_dir):
+        # Check if the file is an image (e.g., .jpg, .png)
+        if filename.endswith(('.jpg', '.png')):
+            # Construct the full path to the image and its corresponding label file
+            image_path = os.path.join(source_dir, filename)
+            label_path = os.path.join(source_dir, os.path.splitext(filename)[0] + '.txt')
+            
+            # Check if the label file exists
+            if os.path.exists(label_path):
+                process_image_and_label(image_path, label_path, output_dir, angle)
 
-print(f"Images and labels have been rotated by {angle} degrees and copied to the output directory with '_rotate_{angle}' appended to their names.")
+    print(f"Images and labels have been rotated by {angle} degrees and copied to the output directory with '_rotate_{angle}' appended to their names.")
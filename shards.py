@@ -0,0 +1,247 @@
+import glob
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import cv2
+import numpy as np
+from PIL import Image
+from labelio import parse_labels
+
+# Samples are stored WebDataset-style: every file of a sample is a tar member named
+# "<key>.<ext>" (e.g. "jitter2_cam1_0001.jpg" and "jitter2_cam1_0001.txt"), the members of a
+# sample are consecutive and never split across shards. Next to the shards, <prefix>-index.jsonl
+# has one line per sample with the shard name and the data offset and size of each member,
+# so a sample can be read back with one seek without scanning the tar.
+
+def encode_image(image, ext, params=None):
+    """Encode a BGR array to bytes the way cv2.imwrite would write it to a file with this extension."""
+    ok, buffer = cv2.imencode(ext, image, params or [])
+    if not ok:
+        raise ValueError(f"Could not encode image as {ext}")
+    return buffer.tobytes()
+
+def encode_pil(image, ext, **save_args):
+    """Encode a PIL image to bytes the way Image.save would write it to a file with this extension."""
+    buffer = io.BytesIO()
+    image.save(buffer, format=Image.registered_extensions()[ext.lower()], **save_args)
+    return buffer.getvalue()
+
+def decode_image(data):
+    """Decode image bytes from a sample to a BGR array."""
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def decode_labels(data):
+    """Parse label bytes from a sample into (class_ids, boxes), see labelio.parse_labels."""
+    return parse_labels(data.decode('utf-8'))
+
+def _split_name(name):
+    key, ext = os.path.splitext(name)
+    return key, ext[1:]
+
+class ShardWriter:
+    """
+    Write samples into size-bounded tar shards plus a jsonl index. Safe to share between threads.
+
+    Shards are named <prefix>-000000.tar, <prefix>-000001.tar... A new shard is started before a
+    sample that would take the current one past max_size bytes or max_count samples. The shards
+    and index of an earlier run with the same prefix are deleted, a reader never mixes the two.
+    """
+
+    def __init__(self, output_dir, prefix="shard", max_size=1 << 30, max_count=100000):
+        """
+        :param output_dir: Folder for the shards and the index
+        :param prefix: Name prefix of the shard and index files
+        :param max_size: Maximum shard size in bytes (a single larger sample still gets its own shard)
+        :param max_count: Maximum number of samples per shard
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        stale = glob.glob(os.path.join(glob.escape(output_dir), f"{glob.escape(prefix)}-[0-9]*.tar"))
+        for path in stale:
+            os.remove(path)
+        if stale:
+            print(f"Removed {len(stale)} shards of an earlier run from {output_dir}")
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.max_size = max_size
+        self.max_count = max_count
+        self.index_path = os.path.join(output_dir, f"{prefix}-index.jsonl")
+        self._index = open(self.index_path, 'w')
+        self._lock = threading.Lock()
+        self._tar = None
+        self.shard_names = []
+        self.shard_count = 0  # Samples in the current shard
+        self.samples = 0
+        self.bytes_written = 0
+
+    def _next_shard(self):
+        if self._tar is not None:
+            self.bytes_written += self._tar.offset
+            self._tar.close()
+        name = f"{self.prefix}-{len(self.shard_names):06d}.tar"
+        self.shard_names.append(name)
+        self._tar = tarfile.open(os.path.join(self.output_dir, name), 'w')
+        self.shard_count = 0
+
+    def write_sample(self, key, files):
+        """
+        Add one sample.
+
+        :param key: Sample key, the output name without extension (e.g. "dilated_cam1_0001")
+        :param files: Dict of extension (without the dot) to file bytes, e.g. {"jpg": ..., "txt": ...}
+        """
+        size = sum(len(data) for data in files.values())
+        with self._lock:
+            if (self._tar is None or
+                    (self.shard_count and (self._tar.offset + size > self.max_size or self.shard_count >= self.max_count))):
+                self._next_shard()
+
+            entry = {"key": key, "shard": self.shard_names[-1], "files": {}}
+            for ext, data in files.items():
+                info = tarfile.TarInfo(f"{key}.{ext}")
+                info.size = len(data)
+                info.mtime = int(time.time())
+                self._tar.addfile(info, io.BytesIO(data))
+                # addfile leaves offset after the data padded to whole blocks
+                padded = -(-len(data) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                entry["files"][ext] = [self._tar.offset - padded, len(data)]
+            self._index.write(json.dumps(entry) + "\n")
+            self.shard_count += 1
+            self.samples += 1
+
+    def close(self):
+        with self._lock:
+            if self._tar is not None:
+                self.bytes_written += self._tar.offset
+                self._tar.close()
+                self._tar = None
+            if not self._index.closed:
+                self._index.close()
+        print(f"Wrote {self.samples} samples to {len(self.shard_names)} shards "
+              f"({self.bytes_written / 1e6:.1f} MB) in {self.output_dir}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+class DirectoryWriter:
+    """Same interface as ShardWriter, but writes every file of a sample as <key>.<ext> into a folder."""
+
+    def __init__(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+
+    def write_sample(self, key, files):
+        for ext, data in files.items():
+            with open(os.path.join(self.output_dir, f"{key}.{ext}"), 'wb') as file:
+                file.write(data)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def write_directory(sink, input_dir):
+    """Write every file of input_dir into a sink unchanged, grouped into samples by file stem."""
+    samples = {}
+    with os.scandir(input_dir) as it:
+        for entry in it:
+            if entry.is_file():
+                key, ext = _split_name(entry.name)
+                samples.setdefault(key, []).append((ext, entry.path))
+    for key, files in samples.items():
+        data = {}
+        for ext, path in files:
+            with open(path, 'rb') as file:
+                data[ext] = file.read()
+        sink.write_sample(key, data)
+
+class ShardReader:
+    """
+    Read samples back from the shards of a ShardWriter, as (key, {ext: bytes}).
+
+    Iterating streams the shards in order without the index. get(key) uses the index to
+    seek straight to the sample's members.
+    """
+
+    def __init__(self, directory, prefix="shard"):
+        self.directory = directory
+        self.prefix = prefix
+        self.shards = sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(prefix)}-[0-9]*.tar")))
+        self.index_path = os.path.join(directory, f"{prefix}-index.jsonl")
+        self._index = None
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        for shard in self.shards:
+            # Stream mode reads the tar front to back with no seeking
+            with tarfile.open(shard, 'r|') as tar:
+                key, files = None, {}
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    member_key, ext = _split_name(member.name)
+                    if member_key != key and files:
+                        yield key, files
+                        files = {}
+                    key = member_key
+                    files[ext] = tar.extractfile(member).read()
+                if files:
+                    yield key, files
+
+    def _load_index(self):
+        if self._index is None:
+            index = {}
+            with open(self.index_path, 'r') as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        index[entry["key"]] = entry
+            self._index = index
+        return self._index
+
+    def keys(self):
+        return list(self._load_index())
+
+    def __len__(self):
+        return len(self._load_index())
+
+    def __contains__(self, key):
+        return key in self._load_index()
+
+    def get(self, key):
+        """Fetch one sample by key as {ext: bytes}. Raises KeyError if the key is not in the index."""
+        entry = self._load_index()[key]
+        files = {}
+        with self._lock:
+            shard = self._files.get(entry["shard"])
+            if shard is None:
+                shard = open(os.path.join(self.directory, entry["shard"]), 'rb')
+                self._files[entry["shard"]] = shard
+            for ext, (offset, size) in entry["files"].items():
+                shard.seek(offset)
+                files[ext] = shard.read(size)
+        return files
+
+    def close(self):
+        with self._lock:
+            for shard in self._files.values():
+                shard.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
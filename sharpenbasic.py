@@ -1,7 +1,11 @@
 import cv2
 import numpy as np
 import os
-import shutil
+import sys
+from filelink import LinkStats, link_file, link_all_files
+from stages import run_stages
+from shards import encode_image, write_directory
+from journal import Journal, atomic_write, remove_partial
 
 def sharpen_image(image):
     # Define the Laplacian kernel
@@ -17,38 +21,80 @@ def sharpen_image(image):
     
     return sharpened_image
 
-def copy_all_files(input_dir, output_dir):
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    for filename in os.listdir(input_dir):
-        file_path = os.path.join(input_dir, filename)
-        if os.path.isfile(file_path):
-            shutil.copy(file_path, output_dir)
-
-def process_images_and_texts(input_dir, output_dir):
-    copy_all_files(input_dir, output_dir)
-
-    for filename in os.listdir(input_dir):
-        if filename.endswith(".jpg") or filename.endswith(".png"):
-            image_path = os.path.join(input_dir, filename)
-            image = cv2.imread(image_path)
-            if image is None:
-                print(f"Failed to read image: {image_path}")
-                continue
-
-            sharpened_image = sharpen_image(image)
-            new_filename = "sharpen_" + filename
-            cv2.imwrite(os.path.join(output_dir, new_filename), sharpened_image)
-
-            # use here to copy and rename .txt file
-            txt_filename = filename.rsplit('.', 1)[0] + '.txt'
-            txt_path = os.path.join(input_dir, txt_filename)
+def copy_all_files(input_dir, output_dir, link_strategy="copy", stats=None, journal=None):
+    link_all_files(input_dir, output_dir, link_strategy, stats, journal)
+
+def process_images_and_texts(input_dir, output_dir, link_strategy="copy", readers=2, writers=2, queue_size=8,
+                             sink=None, resume=False):
+    """
+    Write an augmented copy of every image and its label into output_dir, next to the originals.
+    link_strategy (hardlink, reflink, symlink or copy) decides how the unchanged originals
+    and labels get there, see filelink.py. Decoding and encoding run in reader and writer threads
+    next to the op, see stages.run_stages for readers, writers and queue_size.
+    With a sink (shards.ShardWriter or DirectoryWriter) the originals and the augmented samples
+    are written to the sink instead of output_dir.
+    Outputs are written to a temporary name and renamed into place, and every finished image is
+    appended to .journal-sharpenbasic.jsonl in output_dir. With resume, the items in that journal are
+    skipped, so a run that was killed carries on where it stopped.
+    """
+    if resume and sink is not None:
+        raise ValueError("resume needs output_dir, a sink cannot be resumed")
+
+    stats = LinkStats()
+    journal = None
+    if sink is None:
+        os.makedirs(output_dir, exist_ok=True)
+        if resume:
+            removed = remove_partial(output_dir)
+            if removed:
+                print(f"Removed {removed} partially written files")
+        journal = Journal(os.path.join(output_dir, ".journal-sharpenbasic.jsonl"), resume)
+        copy_all_files(input_dir, output_dir, link_strategy, stats, journal)
+    else:
+        write_directory(sink, input_dir)
+
+    filenames = [f for f in os.listdir(input_dir) if f.endswith(".jpg") or f.endswith(".png")]
+    if journal is not None:
+        filenames = journal.pending(filenames)
+
+    def read(filename):
+        image_path = os.path.join(input_dir, filename)
+        image = cv2.imread(image_path)
+        if image is None:
+            print(f"Failed to read image: {image_path}")
+        return image
+
+    def write(filename, sharpened_image):
+        new_filename = "sharpen_" + filename
+        txt_filename = filename.rsplit('.', 1)[0] + '.txt'
+        txt_path = os.path.join(input_dir, txt_filename)
+
+        if sink is not None:
+            key, ext = os.path.splitext(new_filename)
+            files = {ext[1:]: encode_image(sharpened_image, ext)}
             if os.path.exists(txt_path):
-                new_txt_filename = "sharpen_" + txt_filename
-                shutil.copy(txt_path, os.path.join(output_dir, new_txt_filename))
+                with open(txt_path, 'rb') as file:
+                    files["txt"] = file.read()
+            sink.write_sample(key, files)
+            return
+
+        ext = os.path.splitext(new_filename)[1]
+        atomic_write(os.path.join(output_dir, new_filename), encode_image(sharpened_image, ext))
+
+        # use here to copy and rename .txt file
+        if os.path.exists(txt_path):
+            new_txt_filename = "sharpen_" + txt_filename
+            link_file(txt_path, os.path.join(output_dir, new_txt_filename), link_strategy, stats)
+        journal.mark_done(filename)
+
+    run_stages(filenames, read, lambda filename, image: sharpen_image(image), write,
+               readers, writers, queue_size).report()
+    if sink is None:
+        journal.close()
+        print(f"Link strategy: {link_strategy}")
+        stats.report()
 
 if __name__ == "__main__":
     input_dir = r'c:\Users\Kygo\Desktop\trainCrop'
     output_dir = r'C:\Users\Kygo\Desktop\train'
-    process_images_and_texts(input_dir, output_dir)
+    process_images_and_texts(input_dir, output_dir, link_strategy="copy", resume="--resume" in sys.argv)
@@ -0,0 +1,125 @@
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class _InlineExecutor:
+    """Stands in for a thread pool of size 0: runs the call right away and hands back a finished future."""
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def _executor(workers):
+    return ThreadPoolExecutor(max_workers=workers) if workers > 0 else _InlineExecutor()
+
+class StageStats:
+    """Item counts and time spent per stage. Read and write times are summed over their threads."""
+
+    def __init__(self):
+        self.items = 0
+        self.skipped = 0
+        self.errors = 0
+        self.read_seconds = 0.0
+        self.process_seconds = 0.0
+        self.write_seconds = 0.0
+        self.elapsed = 0.0
+
+    def report(self, unit="images"):
+        rate = self.items / self.elapsed if self.elapsed > 0 else 0.0
+        print(f"Processed {self.items} {unit} in {self.elapsed:.1f}s ({rate:.2f} {unit}/s), "
+              f"{self.skipped} skipped, {self.errors} errors")
+        print(f"Stage time: read {self.read_seconds:.1f}s, process {self.process_seconds:.1f}s, "
+              f"write {self.write_seconds:.1f}s")
+
+def run_stages(items, read, process, write, readers=2, writers=2, queue_size=8):
+    """
+    Run read -> process -> write over items with reading and writing overlapped with processing.
+
+    Decoding and encoding in OpenCV and Pillow release the GIL, so reader and writer threads
+    keep the disk and codecs busy while the calling thread runs the ops. process runs in the
+    calling thread in item order, so random draws happen in the same sequence as a plain loop.
+    At most queue_size items wait in each of the read and write windows, which bounds memory.
+
+    Parameters:
+    - items: Iterable of work items (file names, paths, batches...), passed to every stage.
+    - read: read(item) -> data, run in the reader pool. None skips the item.
+    - process: process(item, data) -> result, run in the calling thread. None skips the item.
+    - write: write(item, result), run in the writer pool.
+    - readers: Number of reader threads, 0 reads inline.
+    - writers: Number of writer threads, 0 writes inline.
+    - queue_size: Maximum number of items read ahead and maximum number of pending writes.
+
+    Returns:
+    - StageStats for the run. A failing item is printed and counted, the others carry on.
+    """
+    stats = StageStats()
+    start = time.perf_counter()
+    queue_size = max(queue_size, 1)
+
+    def timed_read(item):
+        begin = time.perf_counter()
+        data = read(item)
+        return data, time.perf_counter() - begin
+
+    def timed_write(item, result):
+        begin = time.perf_counter()
+        write(item, result)
+        return time.perf_counter() - begin
+
+    with _executor(readers) as read_pool, _executor(writers) as write_pool:
+        reading = deque()
+        writing = deque()
+
+        def drain_writes(limit):
+            while len(writing) > limit:
+                item, future = writing.popleft()
+                try:
+                    stats.write_seconds += future.result()
+                    stats.items += 1
+                except Exception as e:
+                    stats.errors += 1
+                    print(f"Error writing '{item}': {e}")
+
+        def handle(item, future):
+            try:
+                data, seconds = future.result()
+                stats.read_seconds += seconds
+                if data is None:
+                    stats.skipped += 1
+                    return
+                begin = time.perf_counter()
+                result = process(item, data)
+                stats.process_seconds += time.perf_counter() - begin
+            except Exception as e:
+                stats.errors += 1
+                print(f"Error processing '{item}': {e}")
+                return
+            if result is None:
+                stats.skipped += 1
+                return
+            writing.append((item, write_pool.submit(timed_write, item, result)))
+            drain_writes(queue_size)
+
+        for item in items:
+            reading.append((item, read_pool.submit(timed_read, item)))
+            if len(reading) >= queue_size:
+                handle(*reading.popleft())
+        while reading:
+            handle(*reading.popleft())
+        drain_writes(0)
+
+    stats.elapsed = time.perf_counter() - start
+    return stats
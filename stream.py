@@ -0,0 +1,134 @@
+import os
+import random
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from boxes import flip_matrix, transform_boxes
+from labelio import read_labels
+from PipelineFinal import dilate_image, erode_image, elastic_transform
+from jitter import random_color_augmentation
+from sharpenbasic import sharpen_image
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+def photometric(func):
+    """Wrap an image-only augmentation (e.g. random_color_augmentation) so it passes the labels through."""
+    def augmentation(image, boxes, class_ids):
+        return func(image), boxes, class_ids
+    augmentation.__name__ = getattr(func, '__name__', 'photometric')
+    return augmentation
+
+def horizontal_flip(image, boxes, class_ids):
+    """Mirror the image left to right along with its boxes."""
+    height, width = image.shape[:2]
+    boxes, keep = transform_boxes(boxes, flip_matrix(width, height), (width, height))
+    return cv2.flip(image, 1), boxes, class_ids[keep]
+
+def with_probability(augmentation, p):
+    """Apply the augmentation to a sample with probability p, otherwise pass it through."""
+    def maybe(image, boxes, class_ids):
+        if random.random() < p:
+            return augmentation(image, boxes, class_ids)
+        return image, boxes, class_ids
+    return maybe
+
+def elastic(image, boxes, class_ids):
+    """
+    PipelineFinal.elastic_transform with the boxes moved by its affine part. The elastic
+    displacement on top is smooth and only a pixel or two at the default settings, the boxes ignore it.
+    """
+    height, width = image.shape[:2]
+    image, matrix = elastic_transform(image, return_matrix=True)
+    boxes, keep = transform_boxes(boxes, matrix, (width, height))
+    return image, boxes, class_ids[keep]
+
+# Ready-made sample augmentations for the existing image-only ops
+color_jitter = photometric(random_color_augmentation)
+dilate = photometric(dilate_image)
+erode = photometric(erode_image)
+sharpen = photometric(sharpen_image)
+
+class AugmentedStream:
+    """
+    Iterate over a YOLO folder and yield augmented (image_array, boxes_array, class_ids) tuples.
+
+    Nothing is written to disk: each image is decoded, its label parsed and the augmentations
+    applied on the fly, in order. Every augmentation is a callable taking and returning
+    (image, boxes, class_ids); image-only ops can be wrapped with photometric().
+    Images are BGR uint8 arrays, boxes are normalized N x 4 float32 arrays.
+    """
+
+    def __init__(self, source_dir, augmentations=(), prefetch=0, shuffle=False, repeat=False):
+        """
+        :param source_dir: Folder with images and their .txt label files
+        :param augmentations: Sequence of sample augmentations applied in order
+        :param prefetch: Number of background threads loading and augmenting ahead (0 = inline)
+        :param shuffle: Shuffle the sample order on every pass
+        :param repeat: Loop over the folder forever (one new augmentation draw per pass)
+        """
+        self.source_dir = source_dir
+        self.augmentations = list(augmentations)
+        self.prefetch = prefetch
+        self.shuffle = shuffle
+        self.repeat = repeat
+        self.image_paths = sorted(
+            os.path.join(source_dir, f) for f in os.listdir(source_dir)
+            if f.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+    def __len__(self):
+        return len(self.image_paths)
+
+    def load(self, image_path):
+        """Decode, label and augment one sample. Returns None if the image cannot be read."""
+        image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if image is None:
+            print(f"Failed to read image: {image_path}")
+            return None
+        class_ids, boxes = read_labels(os.path.splitext(image_path)[0] + '.txt')
+        for augmentation in self.augmentations:
+            image, boxes, class_ids = augmentation(image, boxes, class_ids)
+        return image, boxes, class_ids
+
+    def _paths(self):
+        while True:
+            paths = list(self.image_paths)
+            if self.shuffle:
+                random.shuffle(paths)
+            yield from paths
+            if not self.repeat:
+                return
+
+    def __iter__(self):
+        if self.prefetch <= 0:
+            for image_path in self._paths():
+                sample = self.load(image_path)
+                if sample is not None:
+                    yield sample
+            return
+
+        # Keep a bounded window of samples loading in the background, yielded in order
+        with ThreadPoolExecutor(max_workers=self.prefetch) as executor:
+            pending = deque()
+            for image_path in self._paths():
+                pending.append(executor.submit(self.load, image_path))
+                if len(pending) >= 2 * self.prefetch:
+                    sample = pending.popleft().result()
+                    if sample is not None:
+                        yield sample
+            while pending:
+                sample = pending.popleft().result()
+                if sample is not None:
+                    yield sample
+
+if __name__ == "__main__":
+    source_dir = r'c:\Users\Kygo\Desktop\train'
+
+    stream = AugmentedStream(
+        source_dir,
+        augmentations=[with_probability(horizontal_flip, 0.5), color_jitter],
+        prefetch=4,
+        shuffle=True,
+    )
+    for image, boxes, class_ids in stream:
+        print(image.shape, boxes.shape, class_ids)